@@ -0,0 +1,352 @@
+"""
+benchmarks of the charting and indicator hot paths over 1e3..1e6 bars.
+runs headless (Agg) on synthetic bars shaped like btc.csv, results are saved per commit in
+`bench_results/<commit>.json` and can be compared against an earlier run:
+
+$ python benchmark.py                      # every benchmark, every size
+$ python benchmark.py -s 1000 10000 -k sma macd
+$ python benchmark.py --compare 0bf79b9    # ratios against bench_results/0bf79b9*.json
+"""
+import matplotlib
+
+matplotlib.use("Agg")
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from statistics import median
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+from stock_utils import cmnfunc as cfc
+from stock_utils import df_man
+from stock_utils.artist.artists import candle, common_artists
+from stock_utils.artist.update import Updater
+from stock_utils.data_pull.bitstamp.datafeed import BFeed
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+RESULTS = "bench_results"
+SAMPLE = "btc.csv"
+WINDOW, UPDATE_SIZE = 300, 100
+BENCHES = {}
+TMP = tempfile.TemporaryDirectory(prefix="bench")  # csvs written for the get_pdf benchmarks
+
+
+def bench(name: str, max_n: int = None):
+    """registers `setup(n) -> callable` as benchmark `name`, skipped for sizes over `max_n`"""
+
+    def register(setup):
+        BENCHES[name] = (setup, max_n)
+        return setup
+
+    return register
+
+
+def synthetic(n: int, seed: int = 0) -> pd.DataFrame:
+    """
+    `n` raw bars (`d,o,h,l,c`, epoch seconds) shaped like `SAMPLE`: same step, start,
+    close to close volatility and wick sizes, drawn as a random walk"""
+    sample = pd.read_csv(SAMPLE)
+    rng = np.random.default_rng(seed)
+    step = float(np.median(np.diff(sample["d"]))) or 60.0
+    c0 = sample["c"].to_numpy()
+    returns = np.diff(np.log(c0))
+    wick = (sample["h"] - sample[["o", "c"]].max(axis=1)).to_numpy() / c0
+    c = c0[0] * np.exp(np.cumsum(rng.normal(0, returns.std() or 1e-4, n)))
+    o = np.concatenate(([c0[0]], c[:-1]))
+    hi, lo = np.maximum(o, c), np.minimum(o, c)
+    h = hi * (1 + rng.choice(wick, n))
+    l = lo * (1 - rng.choice(wick, n))
+    d = sample["d"].iloc[0] + step * np.arange(n)
+    return pd.DataFrame({"d": d, "o": o, "h": h, "l": l, "c": c})
+
+
+def numbered(raw: pd.DataFrame) -> pd.DataFrame:
+    """raw bars indexed by matplotlib dates, like `get_pdf(date_2_num=True, drop_timestamp=True)`"""
+    pdf = raw[cfc.COLUMNS].copy()
+    pdf.index = pd.Index(cfc.epoch2num(raw["d"]), name="d")
+    return pdf
+
+
+def quiet(func):
+    """`func` with its prints swallowed"""
+
+    def call():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func()
+
+    return call
+
+
+@bench("candle.make_candles")
+def _make_candles(n):
+    pdf = numbered(synthetic(n))
+    return quiet(lambda: candle.Candle.make_candles(pdf))
+
+
+@bench("candle.Update.update")
+def _candle_update(n):
+    """scrolls a `WINDOW` bars view over all `n` bars, `UPDATE_SIZE` bars at a time"""
+    pdf = numbered(synthetic(max(n, WINDOW + UPDATE_SIZE)))
+    fig, ax = plt.subplots()
+
+    def scroll():
+        with contextlib.redirect_stdout(io.StringIO()):
+            patches = candle.Candle.make_candles(pdf.iloc[:WINDOW], ax)
+        upd = candle.Update(patches, [0, WINDOW], UPDATE_SIZE, fig, ax)
+        for start in range(WINDOW, len(pdf) - UPDATE_SIZE + 1, UPDATE_SIZE):
+            removed = pdf.index[start - WINDOW : start - WINDOW + UPDATE_SIZE]
+            upd.update(1, pdf.iloc[start : start + UPDATE_SIZE], removed)
+        for patch in patches:
+            if patch is not None:
+                patch.remove()
+
+    return scroll
+
+
+@bench("candle.LodCandles")
+def _lod_candles(n):
+    """pyramid build plus drawing every bar zoomed out on a 1200 px wide axes"""
+    pdf = numbered(synthetic(n))
+    fig, ax = plt.subplots(figsize=(12, 4), dpi=100)
+
+    def draw():
+        lod = candle.LodCandles(df_man.OfflineDfMan(pdf, pyramid=True), ax)
+        lod.disconnect()
+        for patch in lod.patches:
+            patch.remove()
+
+    return draw
+
+
+@bench("update.Updater.update_artists")
+def _updater(n):
+    """
+    25 drags of `UPDATE_SIZE` bars right then 25 back over a `WINDOW` bars view of `n` bars,
+    with the macd / stoch panels"""
+    pdf = numbered(synthetic(max(n, WINDOW + 26 * UPDATE_SIZE)))
+    dfm = df_man.OfflineDfMan(pdf, ylim_tree=True)
+    fig, ax = plt.subplots(3, 1, figsize=(12, 8), sharex=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        patches = candle.Candle.make_candles(pdf.iloc[:WINDOW], ax[0])
+    candles = candle.Update(patches, [0, WINDOW], UPDATE_SIZE, fig, ax[0])
+    carts = common_artists.CArtists(pdf.iloc[:WINDOW])
+    upd = Updater(5, dfm, UPDATE_SIZE, fig.canvas, patches, "ax0", candles, carts)
+    for key, lines, axes in (("ax1", carts.ax1(), ax[1]), ("ax2", carts.ax2(), ax[2])):
+        for line in lines:
+            upd.plot_line(key, line, axes)
+    upd.add_artists()
+    ax[0].set_xlim(dfm.get_locs((0, WINDOW - 1)))
+    fig.canvas.draw()
+
+    def drag():
+        window = [0, WINDOW - 1]
+        for upd.direction in (1,) * 25 + (0,) * 25:
+            if cindex := upd.set_new_xlim(list(window)):
+                window = list(cindex[1])
+                upd.update_artists(cindex)
+
+    return drag
+
+
+def _indicator(name, func):
+    @bench(f"cmnfunc.{name}")
+    def setup(n):
+        pdf = numbered(synthetic(n))
+        return lambda: func(pdf)
+
+
+for _name, _func in {
+    "sma": lambda x: cfc.sma(x["c"], 14),
+    "macd": lambda x: cfc.macd(x["c"]),
+    "stoch": lambda x: cfc.stoch(x),
+    "avg_tr": lambda x: cfc.avg_tr(x),
+    "add_rsi": lambda x: cfc.add_rsi(x["c"]),
+    "wma": lambda x: cfc.wma(x["c"]),
+    "psar": lambda x: cfc.psar(x),
+    "p_sar": lambda x: cfc.p_sar(x),
+    "cross": lambda x: cfc.cross(cfc.sma(x["c"], 9), cfc.sma(x["c"], 26)),
+}.items():
+    _indicator(_name, _func)
+
+
+def _csv(n) -> str:
+    path = tempfile.mkstemp(".csv", "bench", TMP.name)[1]
+    synthetic(n).to_csv(path, index=False)
+    return path
+
+
+@bench("cmnfunc.get_pdf")
+def _get_pdf(n):
+    path = _csv(n)
+    return lambda: cfc.get_pdf(path, date_2_num=True, drop_timestamp=True)
+
+
+@bench("cmnfunc.get_pdf[cache]")
+def _get_pdf_cache(n):
+    path = _csv(n)
+    cfc.get_pdf(path, date_2_num=True, drop_timestamp=True, cache=True)
+    return lambda: cfc.get_pdf(path, date_2_num=True, drop_timestamp=True, cache=True)
+
+
+@bench("BFeed.json_2_pandas", max_n=100_000)
+def _json_2_pandas(n):
+    raw = synthetic(n)
+    ohlc = [
+        {
+            "close": str(c),
+            "high": str(h),
+            "low": str(l),
+            "open": str(o),
+            "timestamp": str(int(d)),
+            "volume": "0.0",
+        }
+        for d, o, h, l, c in raw.itertuples(index=False)
+    ]
+    return lambda: BFeed.json_2_pandas(ohlc)
+
+
+@bench("common_funcs.locators")
+def _locators(n):
+    """1000 get_ilocs / get_locs / find_index / get_ylims calls on random windows"""
+    pdf = numbered(synthetic(n))
+    dfm = df_man.OfflineDfMan(pdf)
+    rng = np.random.default_rng(1)
+    starts = rng.integers(0, max(n - WINDOW, 1), 1000)
+    locs = pdf.index.to_numpy()[starts]
+
+    def locate():
+        for start, loc in zip(starts.tolist(), locs.tolist()):
+            dfm.get_ilocs((loc,))
+            dfm.get_locs((start, start + WINDOW - 1))
+            dfm.find_index(loc - 1e-9)
+            dfm.get_ylims((start, start + WINDOW))
+
+    return locate
+
+
+@bench("common_funcs.locators[ylim_tree]")
+def _locators_tree(n):
+    pdf = numbered(synthetic(n))
+    dfm = df_man.OfflineDfMan(pdf, ylim_tree=True)
+    starts = np.random.default_rng(1).integers(0, max(n - WINDOW, 1), 1000).tolist()
+    return lambda: [dfm.get_ylims((x, x + WINDOW)) for x in starts]
+
+
+@bench("OnlineDFman.append")
+def _online_append(n):
+    """all `n` bars received in batches of `UPDATE_SIZE`, each overlapping the last bar"""
+    pdf = numbered(synthetic(n))
+    batches = [pdf.iloc[max(x - 1, 0) : x + UPDATE_SIZE] for x in range(0, n, UPDATE_SIZE)]
+
+    def append():
+        dfm = df_man.OnlineDFman(None, 0, 1)
+        for batch in batches:
+            dfm.consume(batch)
+
+    return quiet(append)
+
+
+def measure(func, repeat: int = 5, budget: float = 2.0) -> dict:
+    """seconds per call, at most `repeat` calls but fewer once `budget` seconds are spent"""
+    times = []
+    began = time.perf_counter()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+        if time.perf_counter() - began > budget:
+            break
+    return {"min": min(times), "median": median(times), "repeat": len(times)}
+
+
+def commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD", "--", "stock_utils"]).returncode
+        return out.stdout.strip() + ("-dirty" if dirty else "") if out.returncode == 0 else "nogit"
+    except OSError:
+        return "nogit"
+
+
+def run(names, sizes, repeat) -> dict:
+    results = {}
+    for name in names:
+        setup, max_n = BENCHES[name]
+        results[name] = {}
+        for n in sizes:
+            if max_n and n > max_n:
+                continue
+            timing = measure(setup(n), repeat)
+            results[name][str(n)] = timing
+            print(f"{name:36} {n:>9,} {timing['min'] * 1e3:12.3f} ms  ({timing['repeat']} runs)")
+            plt.close("all")
+    return results
+
+
+def save(results: dict, sizes) -> str:
+    os.makedirs(RESULTS, exist_ok=True)
+    rev = commit()
+    path = os.path.join(RESULTS, f"{rev}.json")
+    meta = {
+        "commit": rev,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "matplotlib": matplotlib.__version__,
+        "machine": platform.platform(),
+        "sizes": list(sizes),
+    }
+    with open(path, "w") as wr:
+        json.dump({"meta": meta, "results": results}, wr, indent=1)
+    return path
+
+
+def compare(results: dict, ref: str, threshold: float) -> int:
+    """prints this run against `bench_results/<ref>*.json`, returns the number of regressions"""
+    paths = sorted(glob.glob(os.path.join(RESULTS, f"{ref}*.json")))
+    if not paths:
+        raise FileNotFoundError(f"no results for {ref!r} in {RESULTS}/")
+    with open(paths[0]) as rd:
+        base = json.load(rd)["results"]
+    regressions = 0
+    print(f"\nagainst {paths[0]} (min times, > {threshold:.2f}x flagged)")
+    for name, timings in results.items():
+        for n, timing in timings.items():
+            if (old := base.get(name, {}).get(n)) is None:
+                continue
+            ratio = timing["min"] / old["min"]
+            flag = "  <-- slower" if ratio > threshold else ""
+            regressions += bool(flag)
+            print(f"{name:36} {int(n):>9,} {ratio:8.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("-s", "--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument("-k", "--keep", nargs="+", default=(), help="benchmarks containing any of these")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("--compare", help="commit (prefix) of earlier results")
+    parser.add_argument("--threshold", type=float, default=1.10)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+    names = [x for x in BENCHES if not args.keep or any(k in x for k in args.keep)]
+    results = run(names, args.sizes, args.repeat)
+    if not args.no_save:
+        print(f"\nsaved to {save(results, args.sizes)}")
+    if args.compare:
+        return int(compare(results, args.compare, args.threshold) > 0)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -21,8 +21,8 @@ fig, ax = plt.subplots(
 )
 
 
-pdf = cfc.get_pdf("btc.csv", date_2_num=True, drop_timestamp=True)
-dfm = df_man.OfflineDfMan(pdf)
+pdf = cfc.get_pdf("btc.csv", date_2_num=True, drop_timestamp=True, cache=True)
+dfm = df_man.OfflineDfMan(pdf, ylim_tree=True)
 candles = candle.Candle.make_candles(pdf.iloc[index[0] : index[1]], ax[0])
 candleu = candle.Update(candles, index, UPDATE_SIZE, fig, ax[0])
 carts = common_artists.CArtists(pdf.iloc[index[0] : index[1]])
@@ -35,7 +35,7 @@ ax[0].set_title(json.load(open("stock_utils/bitstamp.json", "r"))["bitstamp"]["e
 pdf = dfm.pdf.copy()
 candles = candle.Candle.make_candles(pdf.iloc[index[0] : index[1]], ax[0])
 candleu = candle.Update(candles, index, UPDATE_SIZE, fig, ax[0])
-carts = common_artists.CArtists(pdf)
+carts = common_artists.CArtists(pdf, streaming=True)
 upd = Updater(
     VALID_MOTION, dfm, UPDATE_SIZE, fig.canvas, candles, "ax0", candleu, carts
 )
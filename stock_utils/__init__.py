@@ -1 +1 @@
-__all__ = ["cmnfunc", "df_man", "rescrutils", "tradingview", "artist"]
+__all__ = ["cmnfunc", "df_man", "rescrutils", "tradingview", "artist", "streaming", "kernels", "batch", "transport", "metrics"]
@@ -2,15 +2,18 @@ import numpy as np
 from matplotlib.path import Path
 from matplotlib.patches import PathPatch
 import pandas as pd
-from matplotlib.path import Path
 from matplotlib import pyplot as plt
 from matplotlib.axes._axes import Axes
 import matplotlib.dates as m_dates
+from stock_utils import metrics
 
 # plt.style.use("dark_background")
 M_KWARGS = {"lw": 1, "fill": None, "alpha": 1}
 RECT_WIDTH = 0.0003
 CANDLE_PATCH_COUNT = 9
+# (d, p) positions of every vertex making up a single candle, see `Candle.make_verts_n_codes`
+CANDLE_VERTS = ((0, 2), (0, 1), (2, 1), (2, 2), (0, 2), (1, 3), (1, 2), (1, 0), (1, 1))
+CANDLE_CODES = np.array([1, 2, 2, 2, 2, 1, 2, 1, 2], dtype=Path.code_type)
 RED, GREEN = "#ff2d21", "green"
 
 
@@ -19,68 +22,45 @@ class Candle:
        simple trail for making 2 mega candles, red and green candles:
     >>> red,green=separate_df(df)
     >>> for x in (red,green):
-        >>> vnc=make_vertices_and_codes(x)
+        >>> vnc=make_verts_n_codes(x)
         >>> axes.add_patch(PathPatch(Path(vnc[0],vnc[1])))
     """
 
-    class _MegaCandle:
-        def __init__(self):
-            """
-            ::
-
-                d0 d1 d2
-                ........
-                 d|        --------->p0
-                  |
-                 c|
-                b----e     --------->p1
-                |    |
-                |    |
-                |    |
-                a----f     --------->p2
-                 g|
-                  |
-                 h|        --------->p3
-            """
-            self.__codes__, self.__vertices__ = [1, 2, 2, 2, 2, 1, 2, 1, 2], None
-            self._c = self.__codes__.copy()
-
-        def __add__(self, vertices: tuple[list, list]):
-            p, d = vertices
-            new_vertices = [
-                (d[0], p[2]),
-                (d[0], p[1]),
-                (d[2], p[1]),
-                (d[2], p[2]),
-                (d[0], p[2]),
-                (d[1], p[3]),
-                (d[1], p[2]),
-                (d[1], p[0]),
-                (d[1], p[1]),
-            ]
-            if self.__vertices__ is None:
-                self.__vertices__ = new_vertices
-                return
-            else:
-                self.__vertices__ += new_vertices
-            self.__codes__ += self._c
-
-        def __sub__(self):
-            self.__vertices__, self.__codes__ = None, self._c
-
-        def get_mega_candle(self):
-            return self.__vertices__, self.__codes__
-
-    def make_verts_n_codes(pdf: pd.DataFrame, openvsclose):
-        y = "o" if openvsclose else "c"
-        i0 = pd.Series(pdf.index)
-        p = (pdf["h"], abs(pdf["o"] - pdf["c"]) + pdf[y], pdf[y], pdf["l"])
-        d = (i0, i0 + (RECT_WIDTH / 2), i0 + RECT_WIDTH)
-        micro_candle = Candle._MegaCandle()
-        for x in range(pdf.shape[0]):
-            micro_candle + ([e.iloc[x] for e in p], [e.iloc[x] for e in d])
-        vnc = micro_candle.get_mega_candle()
-        return vnc
+    def make_verts_n_codes(pdf: pd.DataFrame, openvsclose, width: float = RECT_WIDTH):
+        """
+        builds the vertices and codes of every candle in `pdf` in one batched step.
+        each candle is made of `CANDLE_PATCH_COUNT` vertices:
+        ::
+
+            d0 d1 d2
+            ........
+             d|        --------->p0
+              |
+             c|
+            b----e     --------->p1
+            |    |
+            |    |
+            |    |
+            a----f     --------->p2
+             g|
+              |
+             h|        --------->p3
+
+        `width` is the body width in days, scaled up for coarser bars
+        returns a tuple -> (vertices `(N*9, 2)`, codes `(N*9,)`)
+        """
+        o, h, l, c = (pdf[x].to_numpy(dtype=float) for x in ("o", "h", "l", "c"))
+        y = o if openvsclose else c
+        i0 = np.asarray(pdf.index, dtype=float)
+        p = (h, np.abs(o - c) + y, y, l)
+        d = (i0, i0 + (width / 2), i0 + width)
+        vertices = np.empty((len(i0), CANDLE_PATCH_COUNT, 2))
+        for n, (dn, pn) in enumerate(CANDLE_VERTS):
+            vertices[:, n, 0] = d[dn]
+            vertices[:, n, 1] = p[pn]
+        vertices = vertices.reshape(-1, 2)
+        codes = np.tile(CANDLE_CODES, len(i0))
+        return vertices, codes
 
     def _sep_df(pdf: pd.DataFrame):
         cgo = pdf["c"] >= pdf["o"]
@@ -88,42 +68,119 @@ class Candle:
         cgo = cgo[cgo == True].index
         return ogc, cgo
 
-    def make_raw_paths(pdf: pd.DataFrame):
+    def make_raw_paths(pdf: pd.DataFrame, width: float = RECT_WIDTH):
         ogc, cgo = Candle._sep_df(pdf)
         red = green = None
         if not ogc.empty:
-            red = Candle.make_verts_n_codes(pdf.loc[ogc], 0)
+            red = Candle.make_verts_n_codes(pdf.loc[ogc], 0, width)
         if not cgo.empty:
-            green = Candle.make_verts_n_codes(pdf.loc[cgo], 1)
+            green = Candle.make_verts_n_codes(pdf.loc[cgo], 1, width)
         return red, green
 
     def make_candles(
-        pdf: pd.DataFrame, ax_: Axes = None
+        pdf: pd.DataFrame, ax_: Axes = None, width: float = RECT_WIDTH
     ) -> tuple[PathPatch, PathPatch]:
         """
         returns a tuple of  2 PathPatches containing candles for data provided -> (bear_patch,bull_patch)/(red,green)
         if ax_ : candles are added to ax
         """
-        from time import perf_counter as pf
-
-        x = pf()
-        red, green = Candle.make_raw_paths(pdf)
-        if red:
-            red = PathPatch(Path(*red), ec=RED, **M_KWARGS)
-        if green:
-            green = PathPatch(Path(*green), ec=GREEN, **M_KWARGS)
-        patches = (red, green)
-        if ax_:
-            patches = [
-                ax_.add_patch(patch) if patch is not None else None for patch in patches
-            ]
-        print(f"adding candle patches: {pf()-x:.4f}s")
+        with metrics.timer("candle.make_candles"):
+            red, green = Candle.make_raw_paths(pdf, width)
+            if red:
+                red = PathPatch(Path(*red), ec=RED, **M_KWARGS)
+            if green:
+                green = PathPatch(Path(*green), ec=GREEN, **M_KWARGS)
+            patches = (red, green)
+            if ax_:
+                patches = [
+                    ax_.add_patch(patch) if patch is not None else None for patch in patches
+                ]
+        metrics.count("candle.bars", len(pdf))
         return patches
 
 
 class Update:
     KEY_ = ("e", "u")  # KEY=("b-e-ar","b-u-ll")
 
+    class _CandleBuffer:
+        def __init__(self, capacity: int, path: Path = None):
+            """
+            preallocated vertices and codes of a single colored mega candle.
+
+            live candles are kept in `[start, stop)` with free room on both sides, so a
+            scroll is an index shift plus an in-place write of the new candles only.
+            once a side runs out of room the live candles are re-centred, the buffer only
+            grows if they no longer fit. candles viewed by the last handed out `Path` are
+            never overwritten.
+            """
+            self.__allocate__(capacity)
+            self.start = self.stop = capacity // 2
+            if path is not None:
+                self.write(path.vertices, 1)
+
+        def __len__(self):
+            return self.stop - self.start
+
+        def __allocate__(self, capacity):
+            self.capacity = capacity
+            self.vertices = np.empty((capacity * CANDLE_PATCH_COUNT, 2))
+            self.codes = np.tile(CANDLE_CODES, capacity)
+            self.stamps = np.empty(capacity)
+
+        def _recentre(self, room: int):
+            """
+            copies the live candles to the middle of a fresh buffer leaving at least `room`
+            candles free on each side. the old arrays are left untouched for any `Path`
+            still viewing them.
+            """
+            size = len(self)
+            vertices = self.vertices[
+                self.start * CANDLE_PATCH_COUNT : self.stop * CANDLE_PATCH_COUNT
+            ]
+            stamps = self.stamps[self.start : self.stop]
+            self.__allocate__(max(self.capacity, 2 * (size + 2 * room)))
+            self.start = (self.capacity - size) // 2
+            self.stop = self.start + size
+            self.vertices[
+                self.start * CANDLE_PATCH_COUNT : self.stop * CANDLE_PATCH_COUNT
+            ] = vertices
+            self.stamps[self.start : self.stop] = stamps
+
+        def write(self, vertices: np.ndarray, direction):
+            """writes new candles' vertices after the live ones if direction else before them"""
+            count = len(vertices) // CANDLE_PATCH_COUNT
+            if direction:
+                if self.stop + count > self.capacity:
+                    self._recentre(count)
+                start = self.stop
+                self.stop += count
+            else:
+                if self.start < count:
+                    self._recentre(count)
+                self.start -= count
+                start = self.start
+            self.vertices[
+                start * CANDLE_PATCH_COUNT : (start + count) * CANDLE_PATCH_COUNT
+            ] = vertices
+            self.stamps[start : start + count] = vertices[::CANDLE_PATCH_COUNT, 0]
+
+        def remove(self, to_remove: list, direction):
+            """drops candles with date2num indexes in `to_remove` from the start if direction else from the end"""
+            stamps = self.stamps[self.start : self.stop]
+            if direction:
+                self.start += int(np.searchsorted(stamps, max(to_remove), "right"))
+            else:
+                self.stop = self.start + int(
+                    np.searchsorted(stamps, min(to_remove), "left")
+                )
+
+        def get_path(self) -> Path:
+            """returns a `Path` viewing the live candles, nothing is copied"""
+            live = slice(
+                self.start * CANDLE_PATCH_COUNT, self.stop * CANDLE_PATCH_COUNT, 1
+            )
+            return Path(self.vertices[live], self.codes[live])
+
     def __init__(
         self, patches: tuple[PathPatch, PathPatch], index: list, update_len, fig, axe_
     ):
@@ -132,106 +189,81 @@ class Update:
         self.patches = dict(zip(Update.KEY_, patches))
         self.fig = fig
         self.axe = axe_
-        self.__update_patch_data__()
-
-    def __update_patch_data__(self):
-        """update a simple array for keeping starting indexes for  `1` single candle"""
-        self.patch_data = dict(
-            zip(
-                Update.KEY_,
-                (
-                    x.get_path().vertices[:, 0][::CANDLE_PATCH_COUNT] if x else None
-                    for x in self.patches.values()
-                ),
-            )
-        )
+        capacity = (self._index + update_len) * 4
+        self.buffers = {
+            key: Update._CandleBuffer(capacity, x.get_path() if x else None)
+            for key, x in self.patches.items()
+        }
+        self.__drawn__ = {key: x is not None for key, x in self.patches.items()}
 
     def update(self, direction: int, data: pd.DataFrame, to_remove: list) -> None:
         """updates Pathpatches from index according to direction with data"""
-        self.__update_patch_data__()
-        olde, oldu = self.get_unchanged_patch(direction, to_remove)
-        add2 = Candle.make_raw_paths(data)
-        red, green = Update.append_(olde, oldu, add2, direction)
-        # redc, greenc = [len(x.codes) / CANDLE_PATCH_COUNT for x in (red, green)]
-        # print(f"(+) red codes: {redc}\tgreen codes: {greenc}\ttotal: {redc+greenc}")
-        return red, green
+        with metrics.timer("candle.update"):
+            return self._update(direction, data, to_remove)
+
+    def _update(self, direction: int, data: pd.DataFrame, to_remove: list):
+        paths = []
+        for key, new in zip(Update.KEY_, Candle.make_raw_paths(data)):
+            buffer = self.buffers[key]
+            if len(to_remove) and len(buffer):
+                buffer.remove(to_remove, direction)
+            if new:
+                buffer.write(new[0], direction)
+                self.__drawn__[key] = True
+            paths.append(buffer.get_path() if self.__drawn__[key] else None)
+        return tuple(paths)
 
     def make_new(self, data, color):
         return self.axe.add_patch(PathPatch(data, color=color, **M_KWARGS))
 
-    def append_(olde, oldu, add2, direction):
-        """appends new data to the original one
-        olde & oldu contains red and green old data respectively while
-        add2 contains new data."""
-        newe, newu = add2
-        if olde:
-            if newe:
-                if direction:
-                    new, old = olde, newe
-                else:
-                    new, old = newe, olde
-                red = [np.append(new[x], old[x], axis=0) for x in range(2)]
-            else:
-                red = olde
-        else:
-            red = newe
-        if oldu:
-            if newu:
-                if direction:
-                    new, old = oldu, newu
+
+class LodCandles:
+    def __init__(self, dfman, ax_: Axes, index: list = None):
+        """
+        candles of an `OfflineDfMan(..., pyramid=True)` drawn at the level of detail fitting the
+        axes: whenever the x limits change, the visible bars are taken from the coarsest
+        pyramid level still giving a candle per pixel column, so the drawn vertices depend on
+        the axes width and not on how much data is in view.
+
+        args
+        ----
+        index: int window drawn first, every bar if None
+        """
+        self.dfman, self.axe = dfman, ax_
+        self.patches = [None, None]
+        self.__shown__ = None
+        index = index or (0, len(dfman.pdf))
+        self.draw(dfman.get_locs((index[0], index[1] - 1)))
+        self.cid = ax_.callbacks.connect("xlim_changed", lambda ax: self.draw(ax.get_xlim()))
+
+    def draw(self, xlim):
+        """(re)draw the candles between matplotlib dates `xlim`"""
+        values = self.dfman.__locator__[0]
+        start = int(np.searchsorted(values, xlim[0], "left"))
+        stop = int(np.searchsorted(values, xlim[1], "right"))
+        pixels = max(int(self.axe.bbox.width), 1)
+        factor, data = self.dfman.get_lod((start, stop), pixels)
+        shown = (factor, data.index[0], data.index[-1]) if len(data) else (factor,)
+        if shown == self.__shown__:
+            return
+        self.__shown__ = shown
+        with metrics.timer("candle.lod"):
+            for n, (raw, color) in enumerate(
+                zip(Candle.make_raw_paths(data, RECT_WIDTH * factor), (RED, GREEN))
+            ):
+                path = Path(*raw) if raw else Path(np.empty((0, 2)))
+                if self.patches[n] is None:
+                    # add_artist skips add_patch's per-vertex data limits walk
+                    self.patches[n] = self.axe.add_artist(PathPatch(path, ec=color, **M_KWARGS))
                 else:
-                    new, old = newu, oldu
-                green = [np.append(new[x], old[x], axis=0) for x in range(2)]
-            else:
-                green = oldu
-        else:
-            green = newu
-        if red:
-            red = Path(*red)
-        if green:
-            green = Path(*green)
-        return red, green
+                    self.patches[n].set_path(path)
+            if len(data):
+                lo, hi = data["l"].min(), data["h"].max()
+                self.axe.update_datalim(((data.index[0], lo), (data.index[-1], hi)))
+        metrics.count("candle.bars", len(data))
 
-    def get_unchanged_patch(
-        self, direction, to_remove
-    ) -> tuple[tuple[list, tuple], tuple[list, tuple]]:
-        """returns the vert and codes for the paths that will remain unchanged"""
-        u_remove = len(set(to_remove).intersection(self.patch_data["u"]))
-        e_remove = len(to_remove) - u_remove
-        e_remove, u_remove = (
-            e_remove * CANDLE_PATCH_COUNT,
-            u_remove * CANDLE_PATCH_COUNT,
-        )
-        olde = oldu = None
-        if direction:
-            if e_remove:
-                el = e_remove
-            else:
-                el = 0
-            el = slice(el, None, 1)
-            if u_remove:
-                ul = u_remove
-            else:
-                ul = 0
-            ul = slice(ul, None, 1)
-        else:
-            if e_remove:
-                el = -e_remove
-            else:
-                el = None
-            el = slice(0, el, 1)
-            if u_remove:
-                ul = -u_remove
-            else:
-                ul = None
-            ul = slice(0, ul, 1)
-        if eraw := self.patches["e"]:
-            eraw = eraw.get_path()
-            olde = eraw.vertices.__getitem__(el), eraw.codes.__getitem__(el)
-        if uraw := self.patches["u"]:
-            uraw = uraw.get_path()
-            oldu = uraw.vertices.__getitem__(ul), uraw.codes.__getitem__(ul)
-        return olde, oldu
+    def disconnect(self):
+        self.axe.callbacks.disconnect(self.cid)
 
 
 if __name__ == "__main__":
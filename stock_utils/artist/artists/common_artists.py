@@ -1,22 +1,78 @@
 import pandas as pd
 from stock_utils import cmnfunc as cfc
+from stock_utils import streaming as stm
 
 
 class CArtists:
-    def __init__(self, df: pd.DataFrame):
+    def __init__(self, df: pd.DataFrame, streaming: bool = False):
         """
         CommonArtists
         -------------
-        this module implements artists functions which use the same dataframe"""
+        this module implements artists functions which use the same dataframe
+
+        args
+        ----
+        streaming: seed streaming indicators with `df` and only push bars newer than the
+            ones already seen on every `set_df`, instead of recomputing over the whole df"""
         self.pdf = df
+        self.streams = self.__source__ = None
+        if streaming:
+            self.cover(df)
+
+    def cover(self, df: pd.DataFrame, start: int = None):
+        """
+        cache the indicators over the whole of `df` (the full frame, not a window of it).
+        the first call seeds the streams, later ones only push the bars `df` grew by: a
+        checkpoint is kept before the newest bar, usually still in progress, so revising it
+        is O(1). `start` is the int locator of the first revised bar if older bars changed.
+        calling it again with the same frame object costs nothing"""
+        if df is self.__source__ or df.empty:
+            return
+        self.__source__ = df
+        fresh = self.streams is None or self.streams[0].first_index() != df.index[0]
+        if fresh:
+            self.streams = (stm.StreamMACD(df["c"].iloc[:-1]), stm.StreamStoch(df.iloc[:-1]))
+        streams = []
+        for stream, key in zip(self.streams, ("c", None)):
+            data, last = df[key] if key else df, len(df) - 1
+            at = stream.size if fresh else min(stream.size - 1 if start is None else start, stream.size)
+            kept = stream.size
+            if at < stream.size and (kept := stream.rewind(at)) is None:
+                stream = stream.renew(data.iloc[:last])
+                kept = stream.size
+            stream.extend(data.iloc[kept:last])
+            stream.checkpoint()
+            stream.extend(data.iloc[last:])
+            streams.append(stream)
+        self.streams = tuple(streams)
+
+    def window(self, first, last) -> tuple:
+        """cached (macd, stoch) outputs for index values `first` to `last`, see `cover`"""
+        return tuple(stream.between(first, last) for stream in self.streams)
 
     def set_df(self, df):
         self.pdf = df
+        if self.streams and not df.empty:
+            for stream, key in zip(self.streams, ("c", None)):
+                new = df[df.index > stream.last_index()]
+                if not new.empty:
+                    stream.extend(new[key] if key else new)
+
+    def _from_stream(self, which_: int):
+        """the outputs of stream `which_` for `self.pdf`, None if the stream does not cover it"""
+        if self.streams and not self.pdf.empty:
+            stream = self.streams[which_]
+            if stream.size and stream.first_index() <= self.pdf.index[0]:
+                return stream.between(self.pdf.index[0], self.pdf.index[-1])
 
     def ax1(self):
+        if out := self._from_stream(0):
+            return out
         return cfc.macd(self.pdf["c"])
 
     def ax2(self):
+        if out := self._from_stream(1):
+            return out
         return cfc.stoch(self.pdf)
 
     def ax3(self):
@@ -1,57 +1,98 @@
 import stock_utils.cmnfunc as cmn
+from stock_utils import metrics
 from stock_utils.df_man import OfflineDfMan
 from itertools import cycle
 from stock_utils.artist.artists import candle
-import matplotlib.pyplot as plt
 from matplotlib import dates as mdates
+from matplotlib.transforms import Bbox
 from datetime import timedelta
-import numpy as np
 
 
 class _BlitManager:
-    def __init__(self, canvas, artists: tuple):
+    def __init__(self, canvas, artists: dict):
         """
-        class that manages blitting of single artists.
+        class that manages blitting of the artists in `artists` (axes key -> list of artists).
         simply by:
-            *  add artist(s)
-            *  set_altering()
-            *  change the data for the artist
-            *  update()
+            *  change the data of artist(s) and `changed(artist)`
+            *  set the limits if needed
+            *  frame()
+        every managed artist is animated, so a full draw leaves them out: its background is
+        cached per axes (`on_draw`) and reused until the limits or size of an axes change, or
+        `invalidate()` is called after a style change. a frame restores the backgrounds of the
+        changed axes, draws their artists and blits once
         """
         self.canvas = canvas
-        self.bg_ = self.axes_ = None
         self.artists = artists
+        self.backgrounds = {}  # axes -> (limits and size, background)
+        self.__changed__ = set()
+        self.__animate__()
+        self.cid = canvas.mpl_connect("draw_event", self.on_draw)
 
-    def set_altering(self, axes_name: str, artist_index=0):
-        """
-        *   sets the changing artist to be animated
-        *   draws the figure without the artist # sometimes slow
-        *   stores the pixel buffer
-        *   draw the artist internally
-        *   blit the axes
+    def __animate__(self):
+        for artist_ in self._artists():
+            if not artist_.get_animated():
+                artist_.set_animated(True)
+                self.backgrounds.pop(artist_.axes, None)
+
+    def _artists(self):
+        return [x for y in self.artists.values() for x in y if x is not None]
+
+    def _axes(self):
+        return list(dict.fromkeys(x.axes for x in self._artists()))
+
+    @staticmethod
+    def _state(axes_):
+        """what a background of `axes_` depends on"""
+        return axes_.get_xlim(), axes_.get_ylim(), axes_.bbox.bounds
+
+    def invalidate(self):
+        """drop the cached backgrounds, the next frame draws the figure in full"""
+        self.backgrounds.clear()
+
+    def changed(self, artist_):
+        """mark `artist_` to be drawn by the next `frame`"""
+        self.__changed__.add(artist_)
+
+    def _draw(self, axes: list):
+        """draw the artists of `axes` over their backgrounds"""
+        for artist_ in self._artists():
+            if artist_.axes in axes:
+                artist_.axes.draw_artist(artist_)
+
+    def on_draw(self, event_):
+        """a full draw left the artists out: cache every background and draw them back"""
+        with metrics.timer("blit.on_draw"):
+            self.backgrounds = {
+                x: (self._state(x), self.canvas.copy_from_bbox(x.bbox)) for x in self._axes()
+            }
+            self._draw(self._axes())
+
+    def frame(self):
         """
-        artist_ = self.artists[axes_name][artist_index]
-        self.axes_ = axes_ = artist_.axes
-        self.bg_ = self.canvas.copy_from_bbox(axes_.bbox)
-        artist_.set_animated = True
-        axes_.draw_artist(artist_)
-        self.canvas.blit(axes_.bbox)
-
-    def update(self, axes_name: str, artist_index=0):
+        *   the figure is drawn in full (idle) when a background went stale, `on_draw` then
+            redraws every artist
+        *   otherwise every changed axes is restored, its artists drawn and the union of the
+            axes blitted once
         """
-        *   restore the region
-        *   draw the artist alone
-        *   blit the canvas
-        *   persist the plot
-        *"""
-        artist_ = self.artists[axes_name][artist_index]
-        self.canvas.restore_region(self.bg_)
-        self.axes_.draw_artist(artist_)
-        self.canvas.blit(self.axes_.bbox)
-        artist_.set_animated = False
+        with metrics.timer("blit.frame"):
+            self.__animate__()
+            changed, self.__changed__ = self.__changed__, set()
+            stale = any(
+                self.backgrounds.get(x, (None,))[0] != self._state(x) for x in self._axes()
+            )
+            if stale or not self.canvas.supports_blit:
+                self.canvas.draw_idle()
+                return
+            axes = list(dict.fromkeys(x.axes for x in changed if x is not None))
+            if not axes:
+                return
+            for axes_ in axes:
+                self.canvas.restore_region(self.backgrounds[axes_][1])
+            self._draw(axes)
+            self.canvas.blit(Bbox.union([x.bbox for x in axes]))
 
-    def draw_idle(self):
-        plt.draw()
+    def disconnect(self):
+        self.canvas.mpl_disconnect(self.cid)
 
 
 class Updater:
@@ -121,7 +162,7 @@ class Updater:
         """
         *   adds artist to be managed by `_Blitmanager`.
         *   called after making all needed artists.
-        *   if new artists are made after this call, they -may- not be managed when blitting
+        *   artists added to `self.artists` later are picked up by the next frame
         """
         self.bm = _BlitManager(self.canvas, self.artists)
 
@@ -162,9 +203,11 @@ class Updater:
 
     def update_artists(self, cindex):
         """calls every artist manager's update method with required arguments"""
-        self._ax0(cindex)
-        self._ax1nax2nax3(cindex)
-        self.bm.draw_idle()
+        with metrics.timer("update_artists"):
+            with metrics.timer("update_artists.ax0"):
+                self._ax0(cindex)
+            self._ax1nax2nax3(cindex)
+            self.bm.frame()
 
     def _ax_axis(self, cindex, which_: int):
         lim = self.dfutils.get_locs(cindex[1])
@@ -174,14 +217,13 @@ class Updater:
             self.artists["ax0"][which_].axes.set_ylim(lim)
 
     def validate_n_call(self, axes: str, index: int, data, func, *args):
-        if data:
+        if data is not None:
             artist_ = self.artists[axes][index]
             if artist_:
-                self.bm.set_altering(axes, index)
-                self.artists[axes][index].set_path(data)
-                self.bm.update(axes, index)
+                artist_.set_path(data)
             else:
-                self.artists[axes][index] = func(data, *args)
+                self.artists[axes][index] = artist_ = func(data, *args)
+            self.bm.changed(artist_)
 
     def _ax0(self, cindex):
         to_remove, index_new_data = self._to_remove(cindex)
@@ -198,26 +240,36 @@ class Updater:
         return (min([x.min() for x in ax_art]), max([x.max() for x in ax_art]))
 
     def _general_axis(self, ax_art, key: str):
-        self.bm.set_altering(key, 0)
-        self.bm.set_altering(key, 1)
-        self.artists[key][0].set_data((ax_art[0].index, ax_art[0].values))
-        self.artists[key][1].set_data((ax_art[1].index, ax_art[1].values))
+        with metrics.timer(f"update_artists.{key}"):
+            self.__general_axis__(ax_art, key)
+
+    def __general_axis__(self, ax_art, key: str):
+        for artist_, data in zip(self.artists[key][:2], ax_art):
+            artist_.set_data((data.index, data.values))
+            self.bm.changed(artist_)
         lim = self._general_limit(ax_art)
         if all(lim) and not all(
             [all([not lim[x] > 0, not lim[x] < 0]) for x in range(2)]
         ):
             self.artists[key][0].axes.set_ylim(lim)
-        self.bm.update(key, 0)
-        self.bm.update(key, 1)
 
     def _ax1nax2nax3(self, cindex):
-        cindex = cindex[1]
-        cindex[1] += 1
-        if cindex[0]>100:
-            cindex[0]-=100
-        data = self.dfutils.get_data(cindex)
-        self.ax1U.set_df(data)
-        ax1_art, ax2_art = self.ax1U.update()
+        """
+        the indicators of the whole frame are cached by `ax1U.cover` (from the first bar the
+        manager revised since the last call) and only sliced here, a manager without an
+        in-memory frame (`LazyOfflineDfMan`) recomputes them over the window plus 100 bars of
+        warm-up"""
+        first, last = cindex[1]
+        with metrics.timer("update_artists.indicators"):
+            pdf, revised = self.dfutils.take_revised()
+            if pdf is not None:
+                self.ax1U.cover(pdf, revised)
+                lim = self.dfutils.get_locs((first, min(last, self.dfutils.max_index)))
+                ax1_art, ax2_art = self.ax1U.window(*lim)
+            else:
+                data = self.dfutils.get_data((first - 100 if first > 100 else first, last + 1))
+                self.ax1U.set_df(data)
+                ax1_art, ax2_art = self.ax1U.update()
 
         self._general_axis(ax1_art, "ax1")
         self._general_axis(ax2_art, "ax2")
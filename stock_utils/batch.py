@@ -0,0 +1,76 @@
+"""
+multi-symbol counterparts of the indicators in `cmnfunc`.
+every function takes `(n_symbols, n_bars)` arrays, or a stacked OHLC panel shaped
+`(4, n_symbols, n_bars)` in `cmnfunc.COLUMNS` order, and computes all symbols in one pass
+over a wide frame (one column per symbol). results are `(n_symbols, n_bars)` arrays"""
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import pandas as pd
+from . import cmnfunc as cfc
+
+
+def _wide(arr) -> pd.DataFrame:
+    """bars x symbols frame from a `(n_symbols, n_bars)` array"""
+    return pd.DataFrame(np.atleast_2d(np.asarray(arr, dtype=float)).T)
+
+
+def _out(df: pd.DataFrame) -> np.ndarray:
+    return df.to_numpy().T
+
+
+def _ohlc(panel) -> dict:
+    """a wide frame per OHLC column from a `(4, n_symbols, n_bars)` panel"""
+    return {x: _wide(y) for x, y in zip(cfc.COLUMNS, np.asarray(panel, dtype=float))}
+
+
+def make_panel(frames) -> np.ndarray:
+    """stack equally long OHLC DataFrames (one per symbol) into a `(4, n_symbols, n_bars)` panel"""
+    panel = np.stack([x[cfc.COLUMNS].to_numpy(dtype=float) for x in frames])
+    return panel.transpose(2, 0, 1)
+
+
+def sma(close, window: int) -> np.ndarray:
+    return _out(cfc.sma(_wide(close), window))
+
+
+def macd(close, x=12, y=26, z=9) -> tuple[np.ndarray, np.ndarray]:
+    """-> (signal, md)"""
+    signal, md = cfc.macd(_wide(close), x=x, y=y, z=z)
+    return _out(signal), _out(md)
+
+
+def add_rsi(close, period: int = 14) -> np.ndarray:
+    return _out(cfc.add_rsi(_wide(close), period))
+
+
+def stoch(panel, period=14) -> tuple[np.ndarray, np.ndarray]:
+    """-> (k, D)"""
+    k, D = cfc.stoch(_ohlc(panel), period)
+    return _out(k), _out(D)
+
+
+def avg_tr(panel, window: int = 14) -> np.ndarray:
+    """Average true range"""
+    return _out(cfc.avg_tr(_ohlc(panel), window=window))
+
+
+def _call(args):
+    func, arrays, kwargs = args
+    return func(*arrays, **kwargs)
+
+
+def sharded(func, *arrays, processes: int = None, **kwargs):
+    """
+    spreads `func` over a process pool by splitting `arrays` along the symbol axis
+    (axis -2) into one shard per process and stacks the results back in symbol order.
+
+    >>> signal, md = sharded(macd, close, processes=8, x=12)
+    """
+    arrays = [np.atleast_2d(np.asarray(x, dtype=float)) for x in arrays]
+    processes = min(processes or cpu_count(), arrays[0].shape[-2])
+    shards = zip(*(np.array_split(x, processes, axis=-2) for x in arrays))
+    with Pool(processes) as pool:
+        out = pool.map(_call, [(func, shard, kwargs) for shard in shards])
+    if isinstance(out[0], tuple):
+        return tuple(np.concatenate(x, axis=0) for x in zip(*out))
+    return np.concatenate(out, axis=0)
@@ -2,18 +2,36 @@
 from pytz import utc
 import matplotlib.dates as mdates
 from datetime import datetime
+from hashlib import md5
+import json
+import os
+import tempfile
+import time
 import pandas as pd
 import numpy as np
 from matplotlib import axes
+from . import kernels
 
 COLUMNS = ["o", "h", "l", "c"]
 FORMAT = "%d/%H:%M"
+# utc offsets only change on quarter-hour boundaries, so one lookup per block is enough
+TZ_BLOCK = 900
+CACHE_SUFFIX = ".cols"
+SCAN_BLOCK = 1 << 24
+MUSECONDS_PER_DAY = 86_400_000_000
 
 
 def mdate2readable(x):
     return datetime.strftime(mdates.num2date(x), FORMAT)
 
 
+def num2readable(__nums) -> np.ndarray:
+    """vectorized `mdate2readable` over an array of matplotlib dates"""
+    micros = np.round(np.asarray(__nums, dtype=float) * MUSECONDS_PER_DAY).astype(np.int64)
+    dates = np.datetime64(mdates.get_epoch(), "us") + micros.astype("timedelta64[us]")
+    return pd.DatetimeIndex(dates).strftime(FORMAT).to_numpy(dtype=object)
+
+
 def sma(__ser: pd.Series, window: int):
     return __ser.rolling(window=window).mean()
 
@@ -28,12 +46,33 @@ def convert(__loc1):
     )
 
 
+def epoch2local(__epochs) -> np.ndarray:
+    """vectorized `convert`: epoch timestamps to naive local `datetime64[s]` truncated to the minute"""
+    secs = np.floor(np.asarray(__epochs, dtype=float)).astype(np.int64)
+    blocks, inverse = np.unique(secs // TZ_BLOCK, return_inverse=True)
+    offsets = np.array(
+        [time.localtime(int(x) * TZ_BLOCK).tm_gmtoff for x in blocks], dtype=np.int64
+    )
+    local = secs + offsets[inverse.reshape(-1)]
+    return (local - local % 60).astype("datetime64[s]")
+
+
+def epoch2num(__epochs) -> np.ndarray:
+    """vectorized `convert` followed by `mdates.date2num`"""
+    return mdates.date2num(epoch2local(__epochs))
+
+
+def true_range(h, l, c):
+    """
+    the largest of h - l, |h - previous c| and |l - previous c|, nan terms skipped.
+    takes Series, or bars x symbols frames (`batch.avg_tr`)"""
+    prev = c.shift(1)
+    return np.fmax(np.fmax(h - l, np.abs(h - prev)), np.abs(l - prev))
+
+
 def avg_tr(df: pd.DataFrame, ax_: axes._axes.Axes = None, window: int = 14):
     """Average true range"""
-    hl = df["h"] - df["l"]
-    hc = np.abs(df["h"] - df["c"].shift(1))
-    lc = np.abs(df["l"] - df["c"].shift(1))
-    r = np.max(pd.concat([hl, hc, lc], axis=1), axis=1).rolling(window).sum() / window
+    r = true_range(df["h"], df["l"], df["c"]).rolling(window).sum() / window
     if ax_:
         ax_.plot(r, lw=0.9)
         ax_.set_ylim((r.min(), r.max()))
@@ -58,109 +97,18 @@ def stoch(
 
 
 def psar(df, iaf=0.02, maxaf=0.2, h="h", l="l", c="c"):
-    length = len(df)
-    high = list(df[h])
-    low = list(df[l])
-    close = list(df[c])
-    psar = close[0 : len(close)]
-    bull = True
-    af = iaf
-    hp = high[0]
-    lp = low[0]
-    for i in range(2, length):
-        x = hp if bull else lp
-        psar[i] = psar[i - 1] + af * (x - psar[i - 1])
-        reverse = False
-        if bull:
-            if low[i] < psar[i]:
-                bull = False
-                reverse = True
-                psar[i] = hp
-                lp = low[i]
-                af = iaf
-        else:
-            if high[i] > psar[i]:
-                bull = True
-                reverse = True
-                psar[i] = lp
-                hp = high[i]
-                af = iaf
-
-        if not reverse:
-            if bull:
-                if high[i] > hp:
-                    hp = high[i]
-                    af = min(af + iaf, maxaf)
-                if low[i - 1] < psar[i]:
-                    psar[i] = low[i - 1]
-                if low[i - 2] < psar[i]:
-                    psar[i] = low[i - 2]
-            else:
-                if low[i] < lp:
-                    lp = low[i]
-                    af = min(af + iaf, maxaf)
-                if high[i - 1] > psar[i]:
-                    psar[i] = high[i - 1]
-                if high[i - 2] > psar[i]:
-                    psar[i] = high[i - 2]
+    psar = kernels.psar(df[h].values, df[l].values, df[c].values, iaf, maxaf)
     return pd.Series(psar, index=df.index, name="psar")
 
 
 def p_sar(df, acc_f=0.02, acc_max=0.2):
-    high = df["h"].values
-    low = df["l"].values
-    index = df.index
-    trend = np.zeros(len(df))
-    trend[0] = 1
-    ep = np.zeros(len(df))
-    sar = np.zeros(len(df))
-    for x in range(1, len(df)):
-        if trend[x - 1] == 1:
-            if low[x] > low[x - 1]:
-                trend[x] = 1
-                ep[x] = max(high[x], ep[x - 1])
-            else:
-                trend[x] = -1
-                ep[x] = min(low[x], ep[x - 1])
-        else:
-            if high[x] < high[x - 1]:
-                trend[x] = -1
-                ep[x] = min(low[x], ep[x - 1])
-            else:
-                trend[x] = 1
-                ep[x] = max(high[x], ep[x - 1])
-        if trend[x - 1] == 1:
-            sar[x] = sar[x - 1] + acc_f * (ep[x - 1] - sar[x - 1])
-            sar[x] = min(sar[x], low[x - 1], low[x - 2])
-        else:
-            sar[x] = sar[x - 1] - acc_f * (sar[x - 1] - ep[x - 1])
-            sar[x] = max(sar[x], high[x - 1], high[x - 2])
-
-        if trend[x] == 1 and sar[x] > low[x]:
-            trend[x] = -1
-            sar[x] = ep[x - 1]
-            ep[x] = high[x]
-        elif trend[x] == -1 and sar[x] < high[x]:
-            trend[x] = 1
-            sar[x] = ep[x - 1]
-            ep[x] = low[x]
-        if acc_f < acc_max:
-            acc_f += acc_f
-    sar = np.where(sar == 0, np.nan, sar)
-    return pd.Series(sar, index=index)
+    sar = kernels.p_sar(df["h"].values, df["l"].values, acc_f, acc_max)
+    return pd.Series(sar, index=df.index)
 
 
 def wma(ser: pd.Series, period: int = 14, name="1"):
     """weighted moving average"""
-    index = ser.index
-    close = ser.values
-    weights = np.arange(1, period + 1)
-    weights_sum = np.sum(weights)
-    wma = np.zeros(len(ser))
-    for i in range(period - 1, len(ser)):
-        wma[i] = np.dot(weights, close[i - period + 1 : i + 1]) / weights_sum
-    wma = np.where(wma == 0, np.nan, wma)
-    return pd.Series(wma, index=index, name=name)
+    return pd.Series(kernels.wma(ser.values, period), index=ser.index, name=name)
 
 
 def macd(ser_: pd.Series, ax_: axes = None, x=12, y=26, z=9):
@@ -175,30 +123,165 @@ def macd(ser_: pd.Series, ax_: axes = None, x=12, y=26, z=9):
     return signal, md
 
 
-def get_pdf(
-    _csv_name="datfiles/main1.csv",
+def _cache_dir(_csv_name, options: dict) -> str:
+    """sidecar directory of `_csv_name` for one set of `get_pdf` options (and local timezone)"""
+    options = dict(options, tz=time.tzname, offset=time.timezone)
+    key = md5(json.dumps(options, sort_keys=True).encode()).hexdigest()[:12]
+    return os.path.join(f"{_csv_name}{CACHE_SUFFIX}", key)
+
+
+def _load_cache(path: str, source: os.stat_result):
+    """memory-maps a sidecar written by `_save_cache`, None if missing or stale"""
+    try:
+        with open(os.path.join(path, "meta.json"), "r") as rd:
+            meta = json.load(rd)
+    except (OSError, ValueError):
+        return None
+    if (meta["size"], meta["mtime"]) != (source.st_size, source.st_mtime_ns):
+        return None
+    try:
+        values = np.load(os.path.join(path, "values.npy"), mmap_mode="r")
+        if meta["index"] == "range":
+            index = pd.RangeIndex(len(values), name=meta["index_name"])
+        else:
+            index = np.load(os.path.join(path, "index.npy"), mmap_mode="r")
+            index = pd.Index(index, name=meta["index_name"], copy=False)
+        return pd.DataFrame(values, index=index, columns=meta["columns"], copy=False)
+    except (OSError, ValueError):
+        # missing, partial or from another generation of the sidecar: a cache miss
+        return None
+
+
+def _replace(path: str, name: str, write):
+    """
+    `write(file)` into a temp file of directory `path`, then move it over `name` in one step.
+    frames still mapping the old file keep its inode, so they are never truncated under"""
+    fd, tmp = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=path)
+    try:
+        with os.fdopen(fd, "wb") as wr:
+            write(wr)
+        os.replace(tmp, os.path.join(path, name))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _save_cache(path: str, source: os.stat_result, df: pd.DataFrame):
+    """
+    writes `df` as memory-mappable arrays, meta.json goes last and marks the sidecar as complete.
+    every file is replaced atomically (`_replace`), never written over in place"""
+    if not (df.dtypes == np.float64).all():
+        return
+    meta = {
+        "size": source.st_size,
+        "mtime": source.st_mtime_ns,
+        "columns": list(df.columns),
+        "index_name": df.index.name,
+        "index": "range" if isinstance(df.index, pd.RangeIndex) else "array",
+    }
+    try:
+        os.makedirs(path, exist_ok=True)
+        _replace(path, "values.npy", lambda wr: np.save(wr, df.to_numpy()))
+        if meta["index"] == "array":
+            _replace(path, "index.npy", lambda wr: np.save(wr, np.asarray(df.index)))
+        _replace(path, "meta.json", lambda wr: wr.write(json.dumps(meta).encode()))
+    except OSError:
+        # the sidecar is only an optimization, a read-only location just means no cache
+        pass
+
+
+def _set_pdf_index(
+    df: pd.DataFrame,
     drop_timestamp=False,
-    reset_index=False,
     column1toindex=False,
     convert_2_readable=False,
     date_2_num=False,
 ) -> pd.DataFrame:
-    df = pd.read_csv(_csv_name, index_col=None)
+    """index a raw csv frame from its timestamp column `d` as asked by the `get_pdf` options"""
     index = df.index
     if convert_2_readable:
-        index = df["d"].apply(convert)
+        index = pd.Index(epoch2local(df["d"]).astype("datetime64[ns]"), name="d")
     if date_2_num:
-        index = df["d"].apply(convert).apply(mdates.date2num)
+        index = pd.Index(epoch2num(df["d"]), name="d")
     if column1toindex:
         index = df["d"]
     if drop_timestamp:
         df = df.drop("d", axis=1)
     df.index = index
+    return df
+
+
+def get_pdf(
+    _csv_name="datfiles/main1.csv",
+    drop_timestamp=False,
+    reset_index=False,
+    column1toindex=False,
+    convert_2_readable=False,
+    date_2_num=False,
+    cache=False,
+) -> pd.DataFrame:
+    """
+    load an OHLC csv.
+    if `cache`, the resulting frame is kept in a columnar sidecar (`<csv>.cols/`) next to the csv,
+    later loads validate it against the csv's size & mtime and memory-map it with zero copy
+    (the returned frame is then read-only)"""
+    if cache:
+        options = dict(
+            drop_timestamp=drop_timestamp,
+            reset_index=reset_index,
+            column1toindex=column1toindex,
+            convert_2_readable=convert_2_readable,
+            date_2_num=date_2_num,
+        )
+        source, path = os.stat(_csv_name), _cache_dir(_csv_name, options)
+        if (df := _load_cache(path, source)) is not None:
+            return df
+    df = pd.read_csv(_csv_name, index_col=None)
+    df = _set_pdf_index(
+        df, drop_timestamp, column1toindex, convert_2_readable, date_2_num
+    )
     if reset_index:
         df.reset_index(inplace=True, drop=True)
+    if cache:
+        _save_cache(path, source, df)
     return df
 
 
+def read_chunks(
+    _csv_name,
+    chunksize=100_000,
+    drop_timestamp=False,
+    column1toindex=False,
+    convert_2_readable=False,
+    date_2_num=False,
+):
+    """yields the csv as DataFrames of `chunksize` rows, each indexed like `get_pdf` would"""
+    with pd.read_csv(_csv_name, index_col=None, chunksize=chunksize) as reader:
+        for df in reader:
+            yield _set_pdf_index(
+                df, drop_timestamp, column1toindex, convert_2_readable, date_2_num
+            )
+
+
+def chunk_offsets(_csv_name, chunksize: int) -> tuple[list, np.ndarray, int]:
+    """
+    scans the csv once without parsing it.
+    returns -> (columns, byte offsets of every `chunksize`-th data row, number of data rows)"""
+    size, offsets, rows = os.path.getsize(_csv_name), [], 0
+    with open(_csv_name, "rb") as rd:
+        columns = rd.readline().decode().strip().split(",")
+        starts = np.array([rd.tell()])
+        while True:
+            starts = starts[starts < size]
+            offsets.append(starts[(-rows) % chunksize :: chunksize])
+            rows += len(starts)
+            base = rd.tell()
+            if not (block := rd.read(SCAN_BLOCK)):
+                break
+            starts = np.flatnonzero(np.frombuffer(block, np.uint8) == 10) + base + 1
+    return columns, np.concatenate(offsets), rows
+
+
 def cross(ser1, ser2, count=0, direction=1):
     """returns `count` or less crossing points of  `ser1` and `ser2`.
 
@@ -207,22 +290,8 @@ def cross(ser1, ser2, count=0, direction=1):
     * ->if count is 0, all crossing points are returned.
     * ->`direction` defines where to start looking for crossing points. if 0, `ser1` and `ser2` are reversed.
     """
-    index, ser_index = [], ser1.index
-    ser1 = ser1 - ser2
-    ser1.reset_index(inplace=True, drop=True)
-    if not direction:
-        ser1 = ser1[::-1]
-    ser1 = [ser1 < 0][0]
-    zero, counter = ser1.iloc[0], 0
-    for i in ser1.iloc[1:]:
-        counter += 1
-        if i == zero:
-            continue
-        else:
-            zero = i
-            index.append(counter)
-            if len(index) == count:
-                break
+    ser_index = ser1.index
+    index = kernels.cross((ser1 - ser2).values, count, direction).tolist()
     if not direction:
         index = (np.array(index) * -1).tolist()
         if 0 in index:
@@ -281,34 +350,6 @@ def set_xy_labels(ax_, is_collection=True, axis_facecolor="white"):
     return cursor_reference
 
 
-class Simulate:
-    def __init__(self, __send, __kill):
-        """simulates a data endpoint and sends offline data through a pipe"""
-        self.sender = __send
-        self.control = __kill
-        self.pdf = get_pdf(
-            "datfiles/main2", drop_timestamp=True, raw=True, reset_index=True
-        )
-        # self.pdf.index = [convert(x, True) for x in self.pdf.index]
-        self.send()
-
-    def send(self):
-        """receive some control signal(0) and then sends data through  a pipe"""
-        counter = 150
-        while self.sender.recv() == self.control:
-            if counter != 150:
-                try:
-                    _ = self.pdf.iloc[counter - 1]
-                except IndexError:
-                    _ = self.control
-            else:
-                _ = self.pdf.iloc[:counter]
-            counter += 1
-            self.sender.send(_)
-            if isinstance(_, int):
-                return
-
-
 def human_datefmpl(mpl_date):
     return mdates.num2date(mpl_date).strftime(FORMAT)
 
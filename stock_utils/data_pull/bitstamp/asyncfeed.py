@@ -0,0 +1,294 @@
+"""
+asyncio counterpart of `datafeed.BFeed`.
+pulls are scheduled on an event loop and go through a pool of keep-alive HTTP/1.1
+connections, so one lightweight process can serve many polling loops."""
+import asyncio
+import json
+import ssl
+import time
+from multiprocessing import Event, Process
+from urllib.parse import urlencode, urlsplit
+import pandas as pd
+from stock_utils import metrics
+from stock_utils.transport import consumer_quit, make_pipe
+from . import exceptions
+from .datafeed import URI, BFeed, Uri, read_pairs
+
+
+class HTTPPool:
+    def __init__(self, size: int = 4, timeout: float = 10.0):
+        """
+        HTTPPool
+        --------
+        keep-alive HTTP/1.1 connections per (host, port, scheme), at most `size` open at once
+        for each. idle connections are reused by later requests instead of reconnecting.
+        """
+        self.size, self.timeout = size, timeout
+        self.__idle__, self.__limits__ = {}, {}
+
+    async def _connect(self, key):
+        host, port, https = key
+        return await asyncio.wait_for(
+            asyncio.open_connection(
+                host, port, ssl=ssl.create_default_context() if https else None
+            ),
+            self.timeout,
+        )
+
+    async def _request(self, conn, host: str, target: str):
+        """send a GET on `conn`, returns -> (status, body, keep_alive)"""
+        reader, writer = conn
+        writer.write(
+            (
+                f"GET {target} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n"
+                "Connection: keep-alive\r\nUser-Agent: stock-utilities\r\n\r\n"
+            ).encode()
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise asyncio.IncompleteReadError(b"", None)
+        version, status = status_line.decode().split(" ", 2)[:2]
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = bytearray()
+            while size := int((await reader.readline()).split(b";")[0], 16):
+                body += await reader.readexactly(size)
+                await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            body = bytes(body)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body, keep_alive = await reader.read(), False
+        return int(status), body, keep_alive
+
+    async def get(self, url: str) -> tuple[int, bytes]:
+        """GET `url` -> (status, body)"""
+        parts = urlsplit(url)
+        https = parts.scheme == "https"
+        key = (parts.hostname, parts.port or (443 if https else 80), https)
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        idle = self.__idle__.setdefault(key, [])
+        if key not in self.__limits__:
+            self.__limits__[key] = asyncio.Semaphore(self.size)
+        async with self.__limits__[key]:
+            reused = bool(idle)
+            conn = idle.pop() if reused else await self._connect(key)
+            try:
+                status, body, keep_alive = await asyncio.wait_for(
+                    self._request(conn, parts.hostname, target), self.timeout
+                )
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                conn[1].close()
+                if not reused:
+                    raise
+                # the server dropped an idle connection, retry once on a fresh one
+                conn = await self._connect(key)
+                status, body, keep_alive = await asyncio.wait_for(
+                    self._request(conn, parts.hostname, target), self.timeout
+                )
+            if keep_alive:
+                idle.append(conn)
+            else:
+                conn[1].close()
+        return status, body
+
+    async def close(self):
+        for conns in self.__idle__.values():
+            for _, writer in conns:
+                writer.close()
+            conns.clear()
+
+
+async def fetch(pool: HTTPPool, uri_maker: Uri) -> pd.DataFrame:
+    """a single request for `uri_maker`'s current params, parsed into a DataFrame"""
+    url = f"{uri_maker.uri}{urlencode(uri_maker.params)}"
+    with metrics.timer("feed.request"):
+        status, body = await pool.get(url)
+    metrics.observe("feed.payload_bytes", len(body))
+    if not body:
+        raise exceptions.EmptyResponseError(body)
+    try:
+        with metrics.timer("feed.decode"):
+            data = json.loads(body)["data"]["ohlc"]
+        with metrics.timer("feed.parse"):
+            data = BFeed.json_2_pandas(data)
+        metrics.count("feed.bars", len(data))
+        return data
+    except (json.decoder.JSONDecodeError, KeyError):
+        raise exceptions.UnkownSocketError((status, body))
+
+
+class _Feed:
+    """the Pipe, kill signalling and sleeping shared by the asyncio feeds"""
+
+    def __init__(
+        self,
+        sigok,
+        sigkill: int,
+        pool: HTTPPool = None,
+        shm_capacity: int = None,
+        watermarks: tuple = None,
+    ):
+        self.__sender__, self.recver = make_pipe(shm_capacity, watermarks, sigkill)
+        self.pool = pool
+        self.kill_event = Event()
+        self.sigok, self.sigkill = sigok, sigkill
+
+    def _killed(self) -> bool:
+        """True if asked to quit, by the consumer (`transport.consumer_quit`) or `kill_event`"""
+        if consumer_quit(self.__sender__, self.sigkill):
+            self.kill_event.set()
+        return self.kill_event.is_set()
+
+    async def nap(self, seconds: float) -> bool:
+        """sleep `seconds`, waking up to check for a kill. False if killed"""
+        for _ in range(max(int(seconds * 2), 0)):
+            if self._killed():
+                return False
+            await asyncio.sleep(0.5)
+        return not self._killed()
+
+    async def _fetch(self, uri_maker: Uri) -> pd.DataFrame:
+        if self.pool is None:
+            self.pool = HTTPPool()
+        try:
+            return await fetch(self.pool, uri_maker)
+        except (OSError, asyncio.TimeoutError):
+            self.__sender__.send(self.sigkill)
+            raise Exception("cannot reach www.bitstamp.net")
+
+
+class AsyncBFeed(_Feed):
+    """
+    AsyncBitstamp_Feed
+    ==================
+    schedules pulls of one pair on an event loop and sends the parsed bars through a Pipe
+    exactly like `BFeed`, so `OnlineDFman` can consume either.
+
+    args
+    ----
+        sigok, sigkill: the signals shared with the consumer
+        pool: `HTTPPool` shared by every feed of the loop (one is made if None)
+        base: base uri, `datafeed.URI` or a stand-in server's
+        pair: a config from `datafeed.read_pairs`, the first pair of bitstamp.json if None
+        shm_capacity, watermarks: as in `BFeed`
+    """
+
+    def __init__(
+        self,
+        sigok,
+        sigkill: int,
+        pool: HTTPPool = None,
+        base: str = URI,
+        pair: dict = None,
+        shm_capacity: int = None,
+        watermarks: tuple = None,
+    ):
+        super().__init__(sigok, sigkill, pool, shm_capacity, watermarks)
+        self.uri_maker = Uri(base, pair)
+
+    async def pull(self) -> pd.DataFrame:
+        """a single request, parsed into a DataFrame"""
+        return await self._fetch(self.uri_maker)
+
+    async def sleep_aware(self) -> bool:
+        """sleep until the next pull is due, waking up to check for a kill. False if killed"""
+        if not await self.nap(self.uri_maker.sleep_time):
+            return False
+        self.uri_maker.tweak_uri()
+        return True
+
+    async def run(self, run_forever: bool = True):
+        """pull, send the bars to the consumer and sleep until the next pull is due"""
+        while True:
+            self.__sender__.send(await self.pull())
+            if not run_forever or not await self.sleep_aware():
+                return
+
+
+class MultiFeed(_Feed):
+    """
+    MultiFeed
+    =========
+    polls every pair of bitstamp.json (see `datafeed.read_pairs`) from one event loop, each
+    on its own step. the pairs falling due together are requested concurrently over the
+    shared pool and sent as a single batch: a list of `(pair, DataFrame)`, which
+    `df_man.FeedRouter` hands to one `OnlineDFman` per pair.
+
+    args
+    ----
+        sigok, sigkill: the signals shared with the consumer
+        pairs: configs as returned by `datafeed.read_pairs`, read from bitstamp.json if None.
+            a pair may only appear once, ValueError otherwise
+        pool, base: as in `AsyncBFeed`
+    """
+
+    def __init__(
+        self, sigok, sigkill: int, pairs: list = None, pool: HTTPPool = None, base: str = URI
+    ):
+        super().__init__(sigok, sigkill, pool)
+        uris = [Uri(base, x) for x in (read_pairs() if pairs is None else pairs)]
+        self.uris = {x.pair: x for x in uris}
+        if len(self.uris) < len(uris):
+            twice = sorted({x.pair for x in uris if sum(y.pair == x.pair for y in uris) > 1})
+            raise ValueError(
+                f"pairs {twice} are configured more than once, batches are routed by pair: "
+                "poll each pair once and derive other steps with `OnlineDFman.add_timeframe`"
+            )
+
+    @property
+    def pairs(self) -> list:
+        return list(self.uris)
+
+    async def pull(self, pairs=None) -> list:
+        """request `pairs` (all by default) concurrently -> [(pair, DataFrame), ...]"""
+        pairs = self.pairs if pairs is None else pairs
+        out = await asyncio.gather(*(self._fetch(self.uris[x]) for x in pairs))
+        return list(zip(pairs, out))
+
+    async def run(self, run_forever: bool = True):
+        """pull whichever pairs are due, send them as one batch and sleep until the next is"""
+        now = time.monotonic()
+        due = {x: now + uri.sleep_time for x, uri in self.uris.items()}
+        batch = self.pairs
+        while True:
+            if batch:
+                self.__sender__.send(await self.pull(batch))
+            if not run_forever:
+                return
+            if not await self.nap(min(due.values()) - time.monotonic()):
+                return
+            now = time.monotonic()
+            batch = [x for x, at in due.items() if at <= now + 0.5]
+            for x in batch:
+                self.uris[x].tweak_uri()
+                due[x] = now + self.uris[x].sleep_time
+
+
+async def run_feeds(*feeds: _Feed, run_forever: bool = True):
+    """run every feed's polling loop on the current event loop over one shared `HTTPPool`"""
+    pool = HTTPPool()
+    for feed in feeds:
+        feed.pool = feed.pool or pool
+    try:
+        await asyncio.gather(*(feed.run(run_forever) for feed in feeds))
+    finally:
+        await pool.close()
+
+
+def _serve(feeds, run_forever):
+    asyncio.run(run_feeds(*feeds, run_forever=run_forever))
+
+
+def start_feeds(*feeds: _Feed, run_forever: bool = True) -> Process:
+    """serve all `feeds` from a single process, each feed's `recver` goes to its consumer"""
+    proc = Process(target=_serve, args=(feeds, run_forever))
+    proc.start()
+    return proc
@@ -0,0 +1,109 @@
+"""
+historical backfill beyond the api's page limit (`exceptions.LIMIT`).
+a time range is split into page-sized windows fetched concurrently over an `HTTPPool`
+under a rate limit, then stitched into one sorted frame without duplicates:
+
+>>> pdf = backfill("btcusd", start, end, step=60, csv_name="btc_hist.csv")
+
+frames are indexed by epoch seconds like `cmnfunc.get_pdf(..., column1toindex=True)`"""
+import asyncio
+import json
+import time
+from urllib.parse import urlencode
+import numpy as np
+import pandas as pd
+from stock_utils.cmnfunc import COLUMNS
+from . import exceptions
+from .asyncfeed import HTTPPool
+from .datafeed import URI
+
+
+class RateLimit:
+    def __init__(self, rate: float):
+        """spaces calls to `wait` at least `1 / rate` seconds apart"""
+        self.interval = 1 / rate
+        self.__next__ = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        slot = max(now, self.__next__)
+        self.__next__ = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def windows(start: int, end: int, step: int, limit: int = None) -> list[tuple[int, int]]:
+    """`[start, end]` epoch range split into (start, end) windows of at most `limit` bars"""
+    limit = limit or exceptions.LIMIT["limit"]
+    if limit > exceptions.LIMIT["limit"]:
+        raise exceptions.LimitError(limit)
+    first = start - start % step
+    span = limit * step
+    return [(x, min(x + span - step, end)) for x in range(first, end + 1, span)]
+
+
+def _page(ohlc: list) -> pd.DataFrame:
+    """one page of Bitstamp ohlc json -> epoch indexed OHLC frame"""
+    pdf = pd.DataFrame(ohlc, columns=["timestamp", "open", "high", "low", "close"])
+    pdf = pdf.astype(float)
+    pdf.index = pd.Index(pdf.pop("timestamp").to_numpy(dtype=np.float64), name="d")
+    pdf.columns = COLUMNS
+    return pdf
+
+
+async def _fetch(pool: HTTPPool, limiter: RateLimit, url: str, params: dict) -> pd.DataFrame:
+    await limiter.wait()
+    status, body = await pool.get(f"{url}{urlencode(params)}")
+    if not body:
+        raise exceptions.EmptyResponseError(body)
+    try:
+        return _page(json.loads(body)["data"]["ohlc"])
+    except (json.decoder.JSONDecodeError, KeyError):
+        raise exceptions.UnkownSocketError((status, body))
+
+
+async def backfill_async(
+    pair: str,
+    start: int,
+    end: int,
+    step: int = 60,
+    base: str = URI,
+    pool: HTTPPool = None,
+    rate: float = 8.0,
+    limit: int = None,
+) -> pd.DataFrame:
+    """
+    bars of `pair` with `start <= timestamp <= end` (epoch seconds).
+    pages are requested concurrently (at most `pool.size` in flight) and no faster than
+    `rate` requests per second"""
+    own_pool = pool is None
+    pool = HTTPPool() if own_pool else pool
+    limiter, url = RateLimit(rate), f"{base}{pair}/?"
+    try:
+        pages = await asyncio.gather(
+            *(
+                _fetch(
+                    pool,
+                    limiter,
+                    url,
+                    {"step": step, "limit": limit or exceptions.LIMIT["limit"], "start": x, "end": y},
+                )
+                for x, y in windows(start, end, step, limit)
+            )
+        )
+    finally:
+        if own_pool:
+            await pool.close()
+    pdf = pd.concat(pages) if pages else _page([])
+    pdf = pdf[~pdf.index.duplicated(keep="last")].sort_index()
+    return pdf[(pdf.index >= start) & (pdf.index <= end)]
+
+
+def backfill(pair: str, start: int, end: int, step: int = 60, csv_name: str = None, **kwargs):
+    """
+    blocking `backfill_async`. if `csv_name`, the bars are also written there in the
+    `d,o,h,l,c` layout `cmnfunc.get_pdf` reads"""
+    pdf = asyncio.run(backfill_async(pair, start, end, step, **kwargs))
+    if csv_name:
+        pdf.to_csv(csv_name)
+    return pdf
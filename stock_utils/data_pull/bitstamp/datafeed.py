@@ -7,26 +7,40 @@ from urllib.parse import urlencode
 from itertools import cycle
 from stock_utils.cmnfunc import COLUMNS
 import datetime
-from multiprocessing import Process, Pipe, Event
-from matplotlib.dates import date2num
+from multiprocessing import Process, Event
 from stock_utils import cmnfunc as cfc
+from stock_utils import metrics
+from stock_utils.transport import consumer_quit, make_pipe
 from . import exceptions
 
 URI = "https://www.bitstamp.net/api/v2/ohlc/"
 PATH_ = "stock_utils/bitstamp.json"
 
 
+def read_pairs(path: str = PATH_) -> list[dict]:
+    """
+    one config per pair listed under `"pairs"` in bitstamp.json, each entry overriding
+    the top-level defaults (e.g. only `"exchange"` and `"sec_data_interval"`). a config
+    without `"pairs"` is a single pair"""
+    with open(path, "r") as rd:
+        data = json.load(rd)["bitstamp"]
+    pairs = data.pop("pairs", None) or [{}]
+    return [{**data, **pair} for pair in pairs]
+
+
 class Uri:
-    def __init__(self) -> None:
+    def __init__(self, base: str = URI, pair: dict = None) -> None:
+        """pair: a config from `read_pairs`, the first pair of bitstamp.json if None"""
+        self.base = base
+        self.pair_config = pair
+        self.pair = None
         self.params = {}
         self.cdl = self.sleep_time = self.__delay__ = None
         self.make_url()
 
     def __get_data__(self):
-        rd = open(PATH_, "r")
-        data = json.load(rd)["bitstamp"]
+        data = dict(self.pair_config or read_pairs()[0])
         assert data["exchange"]
-        rd.close()
         return data
 
     def make_url(self):
@@ -42,7 +56,8 @@ class Uri:
         self.cdl = data.pop("continous_data_length")
         self.__delay__ = data.pop("delay")
         self.params.update({"start": self.get_start_epoch()})
-        self.uri = f"{URI}{data.pop('exchange')}/?"
+        self.pair = data.pop("exchange")
+        self.uri = f"{self.base}{self.pair}/?"
 
     def tweak_uri(self):
         """
@@ -61,7 +76,7 @@ class Uri:
         remain = now_ % step
         now_ -= remain
         self.sleep_time = (step - remain) + self.__delay__
-        return now_ - (self.params["limit"] * 60)
+        return now_ - (self.params["limit"] * step)
 
 
 class BFeed:
@@ -73,12 +88,20 @@ class BFeed:
     args
     ----
         interval: interval at which to query more data
+        shm_capacity: hand bars over through a shared-memory ring of that many bars
+            (`transport.ring_pipe`) instead of pickling them through a Pipe, a send then waits
+            for free slots while the ring is full
+        watermarks: (high, low) to hand bars over through a bounded `transport.queue_pipe`
     *   this instance will put new data in a queue.Queue() container
+    *   the feed never waits for the consumer's sigok, signals sent back are only checked for
+        a sigkill
     """
 
-    def __init__(self, sigok, sigkill: int):
+    def __init__(
+        self, sigok, sigkill: int, shm_capacity: int = None, watermarks: tuple = None
+    ):
         self.uri_maker = Uri()
-        self.__sender__, self.recver = Pipe(duplex=True)
+        self.__sender__, self.recver = make_pipe(shm_capacity, watermarks, sigkill)
         self.proc_pull = None
         self.kill_event = Event()
         self.sigok, self.sigkill = sigok, sigkill
@@ -97,9 +120,12 @@ class BFeed:
             self._pull(count, csv_file)
 
     def __pull__(self):
-        data = requests.get(f"{self.uri_maker.uri}{urlencode(self.uri_maker.params)}")
+        with metrics.timer("feed.request"):
+            data = requests.get(f"{self.uri_maker.uri}{urlencode(self.uri_maker.params)}")
+        metrics.observe("feed.payload_bytes", len(data.content))
         if text := data.text:
-            data = json.loads(text)
+            with metrics.timer("feed.decode"):
+                data = json.loads(text)
             return data
         else:
             self.__sender__.send(self.sigkill)
@@ -117,13 +143,18 @@ class BFeed:
             if self.kill_event.is_set():
                 done_sleeping = False
                 break
+            self.check_sender()
             time.sleep(0.5)
         if done_sleeping:
-            if self.__sender__.recv() == self.sigkill:
-                raise exceptions.SenderError
+            self.check_sender()
             self.uri_maker.tweak_uri()
         return done_sleeping
 
+    def check_sender(self):
+        """raises if the consumer asked to quit, see `transport.consumer_quit`"""
+        if consumer_quit(self.__sender__, self.sigkill):
+            raise exceptions.SenderError
+
     def _pull(self, count, csv_file, run_forever=False):
         """
         start the data pulling from Bitstamp and manage pauses between pulls
@@ -135,7 +166,9 @@ class BFeed:
             try:
                 data = self.__pull__()
                 data = data["data"]["ohlc"]
-                data = BFeed.json_2_pandas(data)
+                with metrics.timer("feed.parse"):
+                    data = BFeed.json_2_pandas(data)
+                metrics.count("feed.bars", len(data))
                 self.__sender__.send(data)
                 if run_forever:
                     if not self.sleep_aware():
@@ -149,11 +182,7 @@ class BFeed:
     def json_2_pandas(data_: json) -> pd.DataFrame:
         data = pd.DataFrame(data_)
         data = data.drop("volume", axis=1).iloc[:, [3, 1, 2, 0, 4]]
-        data = data.applymap(float)
-        data.index = (
-            pd.Series(data.pop("timestamp"), name="d")
-            .apply(cfc.convert)
-            .apply(date2num)
-        )
+        data = data.astype(float)
+        data.index = pd.Index(cfc.epoch2num(data.pop("timestamp")), name="d")
         data.columns = COLUMNS
         return data
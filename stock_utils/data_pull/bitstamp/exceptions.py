@@ -0,0 +1,32 @@
+"""errors raised while pulling data from Bitstamp"""
+
+LIMIT = {"limit": 1000}  # max bars per ohlc request accepted by the api
+
+
+class LimitError(Exception):
+    def __init__(self, limit):
+        self.limit = limit
+
+    def __str__(self):
+        return f"requested {self.limit} bars, a single request is limited to {LIMIT['limit']}, see `backfill` for more"
+
+
+class EmptyResponseError(Exception):
+    def __init__(self, content=b""):
+        self.content = content
+
+    def __str__(self):
+        return f"empty response from www.bitstamp.net: {self.content!r}"
+
+
+class UnkownSocketError(Exception):
+    def __init__(self, data=None):
+        self.data = data
+
+    def __str__(self):
+        return f"unexpected response from www.bitstamp.net: {self.data!r}"
+
+
+class SenderError(Exception):
+    def __str__(self):
+        return "the other end of the pipe asked the feed to quit"
@@ -0,0 +1,124 @@
+"""
+a local stand-in for the Bitstamp ohlc endpoint.
+serves Bitstamp-shaped ohlc json from an epoch-indexed DataFrame (e.g. a raw `btc.csv`) so
+feeds can be exercised without the network:
+
+>>> with StandIn(cfc.get_pdf("btc.csv", column1toindex=True)) as server:
+    >>> feed = AsyncBFeed(SIGOK, SIGKILL, base=server.uri)
+"""
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import pandas as pd
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real api
+
+    def setup(self):
+        super().setup()
+        self.served = 0
+        self.server.connections += 1
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        pair = parts.path.strip("/").split("/")[-1]
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        self.server.requests.append((pair, query))
+        body = json.dumps(self.server.ohlc(pair, query)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if size := self.server.chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(0, len(body), size):
+                chunk = body[i : i + size]
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        self.served += 1
+        # hang up without a `Connection: close`, as a server expiring idle connections does
+        self.close_connection = self.served == self.server.keep_alive
+
+    def log_message(self, *_):
+        pass
+
+
+class StandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        pdf: pd.DataFrame,
+        host="127.0.0.1",
+        port=0,
+        pairs: dict = None,
+        chunked: int = 0,
+        keep_alive: int = None,
+    ):
+        """
+        args
+        ----
+        pdf         OHLC DataFrame indexed by epoch seconds served for every pair
+        pairs       optional {pair: DataFrame} served instead of `pdf` for those pairs
+        port        0 picks a free port, see `self.uri`
+        chunked     send bodies in chunks of that many bytes (`Transfer-Encoding: chunked`)
+                    instead of with a `Content-Length`
+        keep_alive  drop each connection after that many requests, unannounced
+        """
+        super().__init__((host, port), _Handler)
+        self.frames = dict(pairs or {})
+        self.pdf = pdf
+        self.chunked, self.keep_alive = chunked, keep_alive
+        self.requests = []
+        self.connections = 0
+        self.thread = None
+
+    @property
+    def uri(self):
+        """base uri to hand to `Uri`/feeds in place of `datafeed.URI`"""
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/api/v2/ohlc/"
+
+    def ohlc(self, pair: str, query: dict) -> dict:
+        """bars with `start <= timestamp (< end)` on the `step` grid, at most `limit` of them"""
+        pdf = self.frames.get(pair, self.pdf)
+        stamps = np.asarray(pdf.index, dtype=np.int64)
+        step, limit = int(query.get("step", 60)), int(query.get("limit", 1000))
+        mask = stamps % step == 0
+        if "start" in query:
+            mask &= stamps >= int(query["start"])
+        if "end" in query:
+            mask &= stamps <= int(query["end"])
+        rows = pdf[mask].iloc[:limit]
+        return {
+            "data": {
+                "pair": pair.upper(),
+                "ohlc": [
+                    {
+                        "close": str(c),
+                        "high": str(h),
+                        "low": str(l),
+                        "open": str(o),
+                        "timestamp": str(int(d)),
+                        "volume": "0.0",
+                    }
+                    for d, o, h, l, c in zip(
+                        rows.index, rows["o"], rows["h"], rows["l"], rows["c"]
+                    )
+                ],
+            }
+        }
+
+    def __enter__(self):
+        self.thread = Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.shutdown()
+        self.server_close()
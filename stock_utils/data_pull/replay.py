@@ -0,0 +1,106 @@
+"""
+replays an OHLC csv (`d,o,h,l,c` with epoch seconds in `d`, like btc.csv) through the same
+Pipe protocol as `bitstamp.datafeed.BFeed`, so the live path can be exercised offline:
+
+>>> replay = Replay("btc.csv", SIGOK, SIGKILL, speed=None, batch_size=50)
+>>> replay.start_pull(run_forever=True)
+>>> dfm = OnlineDFman(replay.recver, SIGOK, SIGKILL)
+"""
+import time
+from multiprocessing import Event, Process
+import numpy as np
+import pandas as pd
+from stock_utils import cmnfunc as cfc
+from stock_utils import metrics
+from stock_utils.data_pull.bitstamp import exceptions
+from stock_utils.transport import consumer_quit, make_pipe
+
+
+class Replay:
+    """
+    Replay
+    ======
+    args
+    ----
+        csv_name: csv to replay, read `chunksize` rows at a time
+        speed: replayed seconds per wall-clock second (1 is real time, 60 a minute bar per
+            second), None replays as fast as possible
+        batch_size: bars per batch sent after the warm-up
+        warmup: bars sent at once first, like the first pull of a live feed
+        shm_capacity, watermarks: transport, as in `BFeed`
+    *   bars go out indexed like `BFeed.json_2_pandas` (matplotlib dates), sigkill follows the
+        last batch
+    *   the bars sent and the seconds the whole replay took are recorded as the `replay.bars`
+        counter and `replay.seconds` in `metrics`
+    """
+
+    def __init__(
+        self,
+        csv_name: str,
+        sigok,
+        sigkill: int,
+        speed: float = 1.0,
+        batch_size: int = 1,
+        warmup: int = 150,
+        chunksize: int = 100_000,
+        shm_capacity: int = None,
+        watermarks: tuple = None,
+    ):
+        self.csv_name, self.chunksize = csv_name, chunksize
+        self.speed, self.batch_size, self.warmup = speed, batch_size, warmup
+        self.__sender__, self.recver = make_pipe(shm_capacity, watermarks, sigkill)
+        self.proc_pull = None
+        self.kill_event = Event()
+        self.sigok, self.sigkill = sigok, sigkill
+
+    def start_pull(self, run_forever: bool = False):
+        """replay in another process if `run_forever`, here otherwise"""
+        if run_forever:
+            self.proc_pull = Process(target=self._pull)
+            self.proc_pull.start()
+        else:
+            self._pull()
+
+    def check_sender(self):
+        """raises if the consumer asked to quit, as `BFeed.check_sender`"""
+        if consumer_quit(self.__sender__, self.sigkill):
+            raise exceptions.SenderError
+
+    def batches(self):
+        """-> (epoch of the batch's last bar, batch) for the warm-up and every later batch"""
+        size = self.warmup or self.batch_size
+        for chunk in cfc.read_chunks(self.csv_name, self.chunksize, drop_timestamp=False):
+            epochs = chunk.pop("d").to_numpy(dtype=np.float64)
+            chunk.index = pd.Index(cfc.epoch2num(epochs), name="d")
+            chunk = chunk[cfc.COLUMNS]
+            start = 0
+            while start < len(chunk):
+                stop = min(start + size, len(chunk))
+                yield epochs[stop - 1], chunk.iloc[start:stop]
+                start, size = stop, self.batch_size
+
+    def wait_until(self, due: float):
+        """sleep until the wall-clock time `due`, checking for a kill"""
+        while (left := due - time.perf_counter()) > 0:
+            if self.kill_event.is_set():
+                return
+            self.check_sender()
+            time.sleep(min(left, 0.5))
+
+    def _pull(self):
+        began = time.perf_counter()
+        first = None
+        try:
+            for epoch, batch in self.batches():
+                if self.kill_event.is_set():
+                    return
+                if self.speed:
+                    first = epoch if first is None else first
+                    self.wait_until(began + (epoch - first) / self.speed)
+                self.check_sender()
+                self.__sender__.send(batch)
+                metrics.count("replay.bars", len(batch))
+        except exceptions.SenderError:
+            return
+        metrics.observe("replay.seconds", time.perf_counter() - began)
+        self.__sender__.send(self.sigkill)
@@ -1,98 +1,722 @@
 """
 contains a class that provides general commonly used function by the artists"""
-from matplotlib.dates import num2date
 from . import cmnfunc as cfc
-from datetime import datetime
+from . import metrics
 from stock_utils.resrcutils.lockables import TCounter
 import pandas as pd
-import time
-from threading import Thread,Event
+import numpy as np
+from threading import Thread,Event,Lock
+from collections import OrderedDict
+from typing import NamedTuple
 
 fmt = cfc.FORMAT
 
 
+class MinMaxTree:
+    def __init__(self, pdf: pd.DataFrame = None, capacity: int = 1024):
+        """
+        MinMaxTree
+        ----------
+        segment tree over the per-bar low/high of `cfc.COLUMNS`.
+        answers y limits for any int range in O(log n) without slicing the DataFrame and
+        takes appended or replaced bars in O(k + log n)
+        """
+        self.size = 0
+        self.__allocate__(capacity)
+        if pdf is not None and not pdf.empty:
+            self.set(0, pdf)
+
+    def __allocate__(self, capacity: int):
+        """(re)allocate leaves for `capacity` bars (rounded to a power of 2) and rebuild the nodes"""
+        cap = 1 << max(int(capacity) - 1, 1).bit_length()
+        lo, hi = np.full(2 * cap, np.inf), np.full(2 * cap, -np.inf)
+        if self.size:
+            lo[cap : cap + self.size] = self.lo[self.cap : self.cap + self.size]
+            hi[cap : cap + self.size] = self.hi[self.cap : self.cap + self.size]
+        self.cap, self.lo, self.hi = cap, lo, hi
+        if self.size:
+            self._rebuild(0, self.size)
+
+    def _rebuild(self, start: int, stop: int):
+        """recompute the nodes above leaves start:stop one level at a time"""
+        l, r = (self.cap + start) // 2, (self.cap + stop - 1) // 2
+        while l:
+            self.lo[l : r + 1] = np.minimum(
+                self.lo[2 * l : 2 * r + 2 : 2], self.lo[2 * l + 1 : 2 * r + 2 : 2]
+            )
+            self.hi[l : r + 1] = np.maximum(
+                self.hi[2 * l : 2 * r + 2 : 2], self.hi[2 * l + 1 : 2 * r + 2 : 2]
+            )
+            l, r = l // 2, r // 2
+
+    def set(self, pos: int, pdf: pd.DataFrame):
+        """writes the bars of `pdf` from int locator `pos` on, replacing any bar already there"""
+        values = pdf[cfc.COLUMNS].to_numpy(dtype=float)
+        if not len(values):
+            return
+        stop = pos + len(values)
+        if stop > self.cap:
+            self.__allocate__(2 * stop)
+        lo, hi = np.fmin.reduce(values, axis=1), np.fmax.reduce(values, axis=1)
+        nan = np.isnan(lo)
+        self.lo[self.cap + pos : self.cap + stop] = np.where(nan, np.inf, lo)
+        self.hi[self.cap + pos : self.cap + stop] = np.where(nan, -np.inf, hi)
+        self.size = max(self.size, stop)
+        self._rebuild(pos, stop)
+
+    def query(self, start, stop):
+        """returns (min, max) for bars `start:stop` (slice semantics) or None if there are none"""
+        start, stop, _ = slice(start, stop).indices(self.size)
+        l, r = start + self.cap, stop + self.cap
+        lo, hi = np.inf, -np.inf
+        while l < r:
+            if l & 1:
+                lo, hi = min(lo, self.lo[l]), max(hi, self.hi[l])
+                l += 1
+            if r & 1:
+                r -= 1
+                lo, hi = min(lo, self.lo[r]), max(hi, self.hi[r])
+            l, r = l // 2, r // 2
+        if lo == np.inf:
+            return None
+        return float(lo), float(hi)
+
+
+def bucket_of(stamps, width: float) -> np.ndarray:
+    """
+    bucket number of every matplotlib date in `stamps` for bars `width` days wide,
+    aligned on multiples of `width` (tolerant to float noise in the stamps)"""
+    return np.floor(np.asarray(stamps, dtype=float) / width + 1e-6).astype(np.int64)
+
+
+def aggregate_arrays(stamps, values: np.ndarray, width: float) -> tuple[np.ndarray, np.ndarray]:
+    """`aggregate` of stamps and a `(4, n_bars)` array in `cfc.COLUMNS` order -> (stamps, values)"""
+    buckets = bucket_of(stamps, width)
+    if not len(buckets):
+        return np.empty(0), np.empty((4, 0))
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    o, h, l, c = values
+    agg = np.stack(
+        (o[starts], np.maximum.reduceat(h, starts), np.minimum.reduceat(l, starts), c[ends])
+    )
+    return buckets[starts] * width, agg
+
+
+def aggregate(pdf: pd.DataFrame, width: float) -> pd.DataFrame:
+    """
+    OHLC bars of `pdf` merged into bars `width` days wide: first open, highest high, lowest
+    low and last close of every bucket, indexed by the bucket's start. buckets without bars
+    are left out"""
+    if pdf.empty:
+        return pdf[cfc.COLUMNS].copy()
+    stamps, values = aggregate_arrays(
+        pdf.index, pdf[cfc.COLUMNS].to_numpy(dtype=float).T, width
+    )
+    return pd.DataFrame(
+        values.T, index=pd.Index(stamps, name=pdf.index.name), columns=cfc.COLUMNS
+    )
+
+
+class OhlcPyramid:
+    FACTORS = (1, 5, 15, 60, 240, 1440)
+
+    def __init__(self, pdf: pd.DataFrame, factors: tuple = FACTORS):
+        """
+        OhlcPyramid
+        -----------
+        the bars of `pdf` at several resolutions, `factors` times its step (1m, 5m, 15m, 1h,
+        4h, 1d for 1-minute bars). every level is aggregated once from the finest level it
+        divides, `levels[factor]` holds its DataFrame
+        """
+        values = np.asarray(pdf.index, dtype=float)
+        self.step = float(np.median(np.diff(values))) if len(values) > 1 else 1 / 1440
+        self.levels = {}
+        for factor in sorted(factors):
+            finer = max((x for x in self.levels if factor % x == 0), default=None)
+            if factor == 1:
+                self.levels[1] = pdf[cfc.COLUMNS]
+            else:
+                self.levels[factor] = aggregate(
+                    self.levels[finer] if finer else pdf, factor * self.step
+                )
+
+    def level_for(self, bars: int, pixels: int) -> int:
+        """the coarsest factor still giving at least a candle per pixel column to `bars` bars"""
+        fits = [x for x in self.levels if bars / x >= pixels]
+        return max(fits, default=min(self.levels))
+
+    def window(self, factor: int, start: float, stop: float) -> pd.DataFrame:
+        """bars of level `factor` whose bucket overlaps the matplotlib dates `start`..`stop`"""
+        level = self.levels[factor]
+        values = level.index.to_numpy(dtype=float)
+        first = np.searchsorted(values, start - factor * self.step, "right")
+        last = np.searchsorted(values, stop, "right")
+        return level.iloc[first:last]
+
+
 class common_funcs:
-    def __init__(self, pdf: pd.DataFrame):
+    def __init__(self, pdf: pd.DataFrame, ylim_tree: bool = False):
         self.pdf = pdf
+        self.ylim_tree = MinMaxTree(pdf) if ylim_tree else None
+        self.set_index()
+
+    def set_index(self):
+        """
+        rebuild the locators after `self.pdf` changed.
+        the sorted index values and the mean step between them are swapped in as a single
+        tuple so a reading thread never sees them out of sync"""
         self.index = pd.Series(self.pdf.index)
+        values = np.asarray(self.pdf.index)
+        step = None
+        if len(values) > 1 and values.dtype.kind in "fi":
+            step = (values[-1] - values[0]) / (len(values) - 1) or None
+        self.__locator__ = (values, step)
+
+    def _locate(self, loc):
+        """
+        int locator of the first index >= loc.
+        evenly spaced indexes (1-minute data) are located arithmetically in O(1), the guess is
+        verified and falls back to a binary search otherwise"""
+        values, step = self.__locator__
+        if step:
+            pos = min(max(int(round((loc - values[0]) / step)), 0), len(values) - 1)
+            if values[pos] < loc:
+                pos += 1
+            if (pos == len(values) or values[pos] >= loc) and (
+                pos == 0 or values[pos - 1] < loc
+            ):
+                return pos
+        return int(np.searchsorted(values, loc, "left"))
 
     def get_data(self, index):
         """returns data from the DataFrame int-indexed by index[0]:index[1]"""
         return self.pdf.iloc[index[0] : index[1]]
 
+    def take_revised(self) -> tuple[pd.DataFrame, int]:
+        """
+        (`self.pdf`, int locator of its first bar changed since the last call). the frame
+        of an offline manager never changes, the locator is then None"""
+        return self.pdf, None
+
     def get_locs(self, ilocs):
         """`return` DataFrame index given integer locators"""
-        return list(self.pdf.iloc[list(ilocs)].index)
+        return self.__locator__[0][list(ilocs)].tolist()
 
     def get_ilocs(self, locs):
         """returns  absolute  int-DataFrame index given DataFrame locators"""
-        return [int(self.index[self.index == x].index[0]) for x in locs]
+        values = self.__locator__[0]
+        ilocs = []
+        for x in locs:
+            pos = self._locate(x)
+            if pos == len(values) or values[pos] != x:
+                raise IndexError(f"{x} is not in the index")
+            ilocs.append(pos)
+        return ilocs
 
     def get_ylims(self, index: tuple):
         """get y limits.
+        *   served by `self.ylim_tree` in O(log n) if it is kept
         *   if limits are equal, return None"""
-        temp_pdf = self.pdf.iloc[index[0] : index[1]][cfc.COLUMNS]
-        lim=(temp_pdf.min().min() , temp_pdf.max().max())
+        if self.ylim_tree is not None:
+            if (lim := self.ylim_tree.query(index[0], index[1])) is None:
+                return lim
+        else:
+            temp_pdf = self.pdf.iloc[index[0] : index[1]][cfc.COLUMNS]
+            lim=(temp_pdf.min().min() , temp_pdf.max().max())
         if lim.count(lim[0])==len(lim):
             lim=None
         return lim
 
     def find_index(self, loc, ifnot=None):
-        index = self.index[self.index >= loc]
-        int_index, loc_index = index.index[0], index.iloc[0]
-        return int_index, loc_index
+        values = self.__locator__[0]
+        int_index = self._locate(loc)
+        if int_index == len(values):
+            raise IndexError(f"no index at or after {loc}")
+        return int_index, values[int_index]
+
+
+class StrIndex:
+    BLOCK = 4096
+
+    def __init__(self, values: np.ndarray, name=None):
+        """
+        lazy `fmt` labels of a date2num index.
+        labels are formatted vectorized a block at a time when first asked for and only the
+        blocks touched so far are kept. indexes like a positional `pd.Series`"""
+        self.values, self.name = values, name
+        self.__blocks__ = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def _block(self, n: int) -> np.ndarray:
+        if (block := self.__blocks__.get(n)) is None:
+            block = cfc.num2readable(
+                self.values[n * StrIndex.BLOCK : (n + 1) * StrIndex.BLOCK]
+            )
+            self.__blocks__[n] = block
+        return block
+
+    def __getitem__(self, key):
+        """a label for an int, a `pd.Series` of labels for a slice"""
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            index = pd.RangeIndex(start, stop, step)
+            if not len(index):
+                return pd.Series([], index=index, dtype=object, name=self.name)
+            first, last = index.min() // StrIndex.BLOCK, index.max() // StrIndex.BLOCK
+            blocks = np.concatenate([self._block(n) for n in range(first, last + 1)])
+            return pd.Series(
+                blocks[index - first * StrIndex.BLOCK], index=index, name=self.name
+            )
+        if not -len(self) <= key < len(self):
+            raise IndexError(key)
+        key %= len(self)
+        return self._block(key // StrIndex.BLOCK)[key % StrIndex.BLOCK]
 
 
 class OfflineDfMan(common_funcs):
-    def __init__(self, df: pd.DataFrame) -> None:
+    def __init__(self, df: pd.DataFrame, ylim_tree: bool = False, pyramid: bool = False) -> None:
         """
         args
         ----
             df - whole dataframe (the source df)
+            ylim_tree - keep a `MinMaxTree` for O(log n) `get_ylims`
+            pyramid - build an `OhlcPyramid` of `df` for `get_lod`, a factor tuple picks the levels
         """
-        super().__init__(df)
-        self.pdf = df
-        self.index = pd.Series(self.pdf.index)
+        super().__init__(df, ylim_tree)
         self.max_index = self.get_ilocs((self.index.iloc[-1],))[0]
-        self.str_index = self.index.apply(num2date).apply(
-            lambda x: datetime.strftime(x, fmt)
+        self.__str_index__ = None
+        self.pyramid = None
+        if pyramid:
+            factors = OhlcPyramid.FACTORS if pyramid is True else pyramid
+            self.pyramid = OhlcPyramid(df, factors)
+
+    def get_lod(self, index: tuple, pixels: int) -> tuple[int, pd.DataFrame]:
+        """
+        the bars of int window `index` at the coarsest pyramid level that still draws a candle
+        per pixel column over `pixels` columns -> (factor, DataFrame)"""
+        start, stop, _ = slice(index[0], index[1]).indices(len(self.pdf))
+        if self.pyramid is None or stop <= start:
+            return 1, self.get_data((start, stop))
+        factor = self.pyramid.level_for(stop - start, pixels)
+        if factor == 1:
+            return 1, self.get_data((start, stop))
+        values = self.__locator__[0]
+        return factor, self.pyramid.window(factor, values[start], values[stop - 1])
+
+    @property
+    def str_index(self):
+        """readable (`fmt`) index labels, made on first access and formatted per requested block"""
+        if self.__str_index__ is None:
+            self.__str_index__ = StrIndex(self.__locator__[0], self.pdf.index.name)
+        return self.__str_index__
+
+
+class LazyOfflineDfMan(common_funcs):
+    def __init__(self, csv_name: str, chunksize: int = 10_000, max_chunks: int = 8) -> None:
+        """
+        OfflineDfMan for histories larger than RAM.
+        the csv (a `get_pdf(date_2_num=True, drop_timestamp=True)` source) is scanned once for the
+        byte offset and first timestamp of every chunk, windows asked by `get_data`, `get_ylims`,
+        `get_locs` ... are then read chunk by chunk and at most `max_chunks` chunks are kept.
+
+        args
+        ----
+            csv_name - the source csv
+            chunksize - rows per chunk
+            max_chunks - chunks kept in memory, least recently used ones are dropped
+        """
+        self.csv_name, self.chunksize, self.max_chunks = csv_name, chunksize, max_chunks
+        self.columns, self.offsets, rows = cfc.chunk_offsets(csv_name, chunksize)
+        self.__chunks__ = OrderedDict()
+        self.ylim_tree = self.pdf = None
+        self.max_index = rows - 1
+        with open(csv_name, "rb") as rd:
+            column = self.columns.index("d")
+            firsts = []
+            for offset in self.offsets:
+                rd.seek(offset)
+                firsts.append(float(rd.readline().split(b",")[column]))
+        self.firsts = cfc.epoch2num(firsts)
+
+    def _chunk(self, n: int) -> pd.DataFrame:
+        """chunk `n`, read from the csv if it is not kept already"""
+        if (chunk := self.__chunks__.get(n)) is not None:
+            self.__chunks__.move_to_end(n)
+            return chunk
+        with open(self.csv_name, "rb") as rd:
+            rd.seek(self.offsets[n])
+            chunk = pd.read_csv(
+                rd, header=None, names=self.columns, nrows=self.chunksize
+            )
+        chunk = cfc._set_pdf_index(chunk, drop_timestamp=True, date_2_num=True)
+        self.__chunks__[n] = chunk
+        if len(self.__chunks__) > self.max_chunks:
+            self.__chunks__.popitem(last=False)
+        return chunk
+
+    def get_data(self, index):
+        """returns data from the DataFrame int-indexed by index[0]:index[1]"""
+        start, stop, _ = slice(index[0], index[1]).indices(self.max_index + 1)
+        if start >= stop:
+            return self._chunk(0).iloc[:0]
+        chunks = range(start // self.chunksize, (stop - 1) // self.chunksize + 1)
+        data = pd.concat([self._chunk(n) for n in chunks])
+        offset = chunks[0] * self.chunksize
+        return data.iloc[start - offset : stop - offset]
+
+    def get_locs(self, ilocs):
+        """`return` DataFrame index given integer locators"""
+        ilocs = [x % (self.max_index + 1) for x in ilocs]
+        return [
+            float(self._chunk(x // self.chunksize).index[x % self.chunksize])
+            for x in ilocs
+        ]
+
+    def _locate(self, loc):
+        """int locator of the first index >= loc"""
+        n = max(int(np.searchsorted(self.firsts, loc, "right")) - 1, 0)
+        pos = int(np.searchsorted(self._chunk(n).index, loc, "left"))
+        return n * self.chunksize + pos
+
+    def get_ilocs(self, locs):
+        """returns  absolute  int-DataFrame index given DataFrame locators"""
+        ilocs = []
+        for x in locs:
+            pos = self._locate(x)
+            if pos > self.max_index or self.get_locs((pos,))[0] != x:
+                raise IndexError(f"{x} is not in the index")
+            ilocs.append(pos)
+        return ilocs
+
+    def get_ylims(self, index: tuple):
+        """get y limits.
+        *   if limits are equal, return None"""
+        temp_pdf = self.get_data(index)[cfc.COLUMNS]
+        if temp_pdf.empty:
+            return None
+        lim = (temp_pdf.min().min(), temp_pdf.max().max())
+        if lim.count(lim[0]) == len(lim):
+            lim = None
+        return lim
+
+    def find_index(self, loc, ifnot=None):
+        int_index = self._locate(loc)
+        if int_index > self.max_index:
+            raise IndexError(f"no index at or after {loc}")
+        return int_index, self.get_locs((int_index,))[0]
+
+
+class Upsert(NamedTuple):
+    """what a `BarStore.upsert` changed"""
+
+    start: int  # first int locator whose bar changed or was appended
+    replaced: np.ndarray  # int locators of stored bars whose values were replaced
+    appended: int  # number of bars appended
+    dropped: int  # number of older bars not in the store, ignored
+
+
+class BarStore:
+    def __init__(self, capacity: int = 1024):
+        """
+        BarStore
+        --------
+        growable columnar store of bars (index + one row per column).
+        capacity doubles when full so appends are O(1) amortized, and `snapshot` hands out
+        read-only DataFrame views which stay valid while more bars are appended"""
+        self.capacity, self.size = capacity, 0
+        self.columns = self.name = None
+        self.__index__ = self.__values__ = None
+        self.__view__ = (np.empty(0), np.empty((0, 0)), 0)
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, size: int):
+        capacity = max(self.capacity, 2 * len(self.__index__), size)
+        index, values = np.empty(capacity), np.empty((len(self.columns), capacity))
+        index[: self.size] = self.__index__[: self.size]
+        values[:, : self.size] = self.__values__[:, : self.size]
+        self.__index__, self.__values__ = index, values
+
+    def _columns(self, columns, name=None):
+        if self.columns is None:
+            self.columns, self.name = list(columns), name
+            self.__index__ = np.empty(0)
+            self.__values__ = np.empty((len(self.columns), 0))
+
+    def append(self, data: pd.DataFrame):
+        """copy the bars of `data` after the stored ones"""
+        if data.empty:
+            return
+        self._columns(data.columns, data.index.name)
+        self.append_arrays(data.index, data[self.columns].to_numpy(dtype=float).T)
+
+    def append_arrays(self, stamps: np.ndarray, values: np.ndarray):
+        """`append` of bars given as stamps and a `(n_columns, n_bars)` array of values"""
+        if not len(stamps):
+            return
+        stop = self.size + len(stamps)
+        if stop > len(self.__index__):
+            self._grow(stop)
+        self.__index__[self.size : stop] = stamps
+        self.__values__[:, self.size : stop] = values
+        self.size = stop
+        self.__view__ = (self.__index__, self.__values__, stop)
+
+    def upsert(self, data: pd.DataFrame) -> "Upsert":
+        """
+        merge `data` by timestamp: a bar sharing its timestamp with a stored bar replaces it
+        (in place, earlier snapshots see it too), strictly newer bars are appended and older
+        bars missing from the store are dropped. returns what changed as an `Upsert`"""
+        if data.empty:
+            return Upsert(self.size, np.empty(0, dtype=np.int64), 0, 0)
+        data = data[~data.index.duplicated(keep="last")].sort_index()
+        self._columns(data.columns, data.index.name)
+        return self.upsert_arrays(
+            np.asarray(data.index, dtype=float), data[self.columns].to_numpy(dtype=float).T
         )
 
+    def upsert_arrays(self, stamps: np.ndarray, values: np.ndarray) -> "Upsert":
+        """`upsert` of sorted unique stamps and a `(n_columns, n_bars)` array of values"""
+        if not self.size:
+            self.append_arrays(stamps, values)
+            return Upsert(0, np.empty(0, dtype=np.int64), len(stamps), 0)
+        size, index = self.size, self.__index__[: self.size]
+        newer = stamps > index[-1]
+        pos = np.searchsorted(index, stamps[~newer])
+        found = pos < size
+        found[found] = index[pos[found]] == stamps[~newer][found]
+        pos, new = pos[found], values[:, ~newer][:, found]
+        old = self.__values__[:, pos]
+        changed = ((old != new) & ~(np.isnan(old) & np.isnan(new))).any(axis=0)
+        pos = pos[changed]
+        self.__values__[:, pos] = new[:, changed]
+        self.append_arrays(stamps[newer], values[:, newer])
+        start = int(pos.min()) if len(pos) else size
+        return Upsert(start, pos, int(newer.sum()), int((~found).sum()))
+
+    def last(self) -> tuple[float, np.ndarray]:
+        """(timestamp, values) of the newest stored bar"""
+        return self.__index__[self.size - 1], self.__values__[:, self.size - 1]
+
+    def snapshot(self) -> pd.DataFrame:
+        """read-only DataFrame viewing every stored bar, nothing is copied"""
+        index, values, size = self.__view__
+        if self.columns is None:
+            return pd.DataFrame()
+        index, values = index[:size].view(), values[:, :size].view()
+        index.flags.writeable = values.flags.writeable = False
+        return pd.DataFrame(
+            values.T,
+            index=pd.Index(index, name=self.name, copy=False),
+            columns=self.columns,
+            copy=False,
+        )
+
+
+class Timeframe:
+    def __init__(self, seconds: int):
+        """
+        Timeframe
+        ---------
+        bars `seconds` wide (bucketed like `aggregate`) kept up to date as base bars arrive.
+        appended base bars are folded into the open bar in O(1) per bar, revised base bars
+        re-aggregate only the buckets from theirs on. `self.pdf` is a read-only snapshot
+        and `self.changes` tells which of its bars the last update touched
+        """
+        self.seconds, self.width = seconds, seconds / 86400
+        self.store = BarStore()
+        self.store._columns(cfc.COLUMNS, "d")
+        self.changes = None
+
+    @property
+    def pdf(self) -> pd.DataFrame:
+        return self.store.snapshot()
+
+    def update(self, base: BarStore, changes: "Upsert") -> int:
+        """
+        fold the bars of `base` changed by `changes` (from `base.upsert`) in.
+        returns the int locator of the first bar of this timeframe that changed"""
+        size = len(base)
+        if changes.start >= size:
+            return self.store.size
+        index, values = base.__index__[:size], base.__values__[:, :size]
+        if base.columns != cfc.COLUMNS:
+            values = values[[base.columns.index(x) for x in cfc.COLUMNS]]
+        appended = not len(changes.replaced) and changes.start == size - changes.appended
+        if appended and self.store.size:
+            start = changes.start
+            stamps, agg = aggregate_arrays(index[start:], values[:, start:], self.width)
+            stamp, last = self.store.last()
+            if stamps[0] == stamp:
+                agg[:, 0] = last[0], max(last[1], agg[1, 0]), min(last[2], agg[2, 0]), agg[3, 0]
+        else:
+            first = bucket_of(index[changes.start : changes.start + 1], self.width)[0]
+            pos = int(np.searchsorted(index, (first - 1e-6) * self.width, "left"))
+            stamps, agg = aggregate_arrays(index[pos:], values[:, pos:], self.width)
+        self.changes = self.store.upsert_arrays(stamps, agg)
+        return self.changes.start
+
 
 class OnlineDFman(common_funcs):
-    def __init__(self, recv, sigok:int,sigkill: int) -> None:
+    def __init__(self, recv, sigok:int,sigkill: int, ylim_tree: bool = False) -> None:
         """
         args
         ----
-        recv    endpoint of a mutliprocessing.Pipe
+        recv    endpoint of a mutliprocessing.Pipe, None when batches are handed to `consume`
+                by someone else (e.g. `FeedRouter`)
         sigok   for checking everything is alright on the other end
         sigkill for sending to the other end if this end decides to quit
+        ylim_tree   keep a `MinMaxTree` extended with every received batch
 
         Notes
         -----
         a thread will be used to update local values an any shared data locally will be held by a thread lock
+        (`self.lock`, held while a batch is consumed and while streams / timeframes are added)
+        received bars are upserted into a `BarStore` by timestamp, `self.pdf` is a read-only snapshot
+        of it and `self.changes` tells which bars the last batch touched
         """
-        super().__init__(pd.DataFrame())
+        super().__init__(pd.DataFrame(), ylim_tree)
         self.data = recv
         self._sigok, self._sigkill = sigok,sigkill
-        self.index = self.max_index = None
+        self.max_index = self.changes = None
+        self.streams, self.timeframes = {}, {}
+        self.store = BarStore()
+        self.lock = Lock()
+        self.__revised__ = None
 
-        self.data_thread = Thread(target=(self.recv_data))
-        self.data_thread.start()
+        self.data_thread = None
+        if recv is not None:
+            self.data_thread = Thread(target=(self.recv_data))
+            self.data_thread.start()
+
+    def add_timeframe(self, key: str, seconds: int) -> Timeframe:
+        """
+        keep bars `seconds` wide (e.g. 300, 900, 3600, 14400) built from the received ones as a
+        `Timeframe` in `self.timeframes[key]`"""
+        timeframe = Timeframe(seconds)
+        with self.lock:
+            if len(self.store):
+                timeframe.update(self.store, Upsert(0, np.empty(0, dtype=np.int64), len(self.store), 0))
+            self.timeframes[key] = timeframe
+        return timeframe
+
+    def add_stream(self, key: str, stream, column: str = None, timeframe: str = None):
+        """
+        register a `streaming` indicator seeded with the current frame (or with the bars of
+        `self.timeframes[timeframe]`). every received batch (or `batch[column]`) is pushed into
+        it, `self.streams[key][0]` holds the indicator"""
+        with self.lock:
+            self.streams[key] = (stream, column, timeframe)
+
+    def _update_streams(self, start: int, timeframe: str = None):
+        """
+        bring the streams of `timeframe` up to date with its frame (`self.pdf` if None) after
+        bars from int locator `start` on changed. a checkpoint is kept before the newest bar,
+        which is usually still in progress, so revising it costs O(1); deeper revisions
+        renew the stream"""
+        pdf = self.pdf if timeframe is None else self.timeframes[timeframe].pdf
+        if start >= len(pdf):
+            return
+        for key, (stream, column, frame) in self.streams.items():
+            if frame != timeframe:
+                continue
+            data = pdf[column] if column else pdf
+            kept = stream.size
+            if start < stream.size:
+                if (kept := stream.rewind(start)) is None:
+                    stream = stream.renew(data.iloc[: len(data) - 1])
+                    self.streams[key] = (stream, column, frame)
+                    kept = stream.size
+            stream.extend(data.iloc[kept : len(data) - 1])
+            stream.checkpoint()
+            stream.extend(data.iloc[len(data) - 1 :])
+
+    def take_revised(self) -> tuple[pd.DataFrame, int]:
+        """
+        (`self.pdf`, int locator of its first bar changed by the batches consumed since the
+        last call, None if none was)"""
+        with self.lock:
+            revised, self.__revised__ = self.__revised__, None
+            return self.pdf, revised
 
     def local_update(self):
         """update local values after a read on the pipe"""
-        self.index = pd.Series(self.pdf.index)
+        self.set_index()
         self.max_index = self.get_ilocs((self.index.iloc[-1],))[0]
 
+    def consume(self, data: pd.DataFrame):
+        """upsert a received batch and bring the index, ylim tree and streams up to date"""
+        with metrics.timer("dfman.append"), self.lock:
+            self.changes = self.store.upsert(data)
+            self.pdf = self.store.snapshot()
+            if self.__revised__ is None or self.changes.start < self.__revised__:
+                self.__revised__ = self.changes.start
+            if self.ylim_tree is not None:
+                start = self.changes.start
+                self.ylim_tree.set(start, self.pdf.iloc[start:])
+            self._update_streams(self.changes.start)
+            for key, timeframe in self.timeframes.items():
+                self._update_streams(timeframe.update(self.store, self.changes), key)
+            self.local_update()
+        metrics.count("dfman.bars", len(data))
+
     def recv_data(self):
         while 1:
             data = self.data.recv()
             if isinstance(data, pd.DataFrame):
-                print("data-length: ",data.shape,' as of ',cfc.convert(int(time.time())))
-                self.pdf = pd.concat([self.pdf, data], axis=0)
+                self.consume(data)
+                self.data.send(self._sigok)
+            else:
+                if data == self._sigkill:
+                    return
+
+
+class FeedRouter:
+    def __init__(self, recv, sigok: int, sigkill: int, pairs=(), ylim_tree: bool = False) -> None:
+        """
+        args
+        ----
+        recv    endpoint of the Pipe of a feed sending batches of `(pair, DataFrame)`,
+                e.g. `asyncfeed.MultiFeed.recver`
+        pairs   pairs to make consumers for up front, see `add`
+        ylim_tree   passed on to every `OnlineDFman`
+
+        Notes
+        -----
+        a single thread reads the pipe and hands every pair's bars to its own `OnlineDFman`
+        (`self.dfmans[pair]`), so adding pairs adds no threads or pipes. bars of pairs
+        without a consumer are dropped
+        """
+        self.data = recv
+        self._sigok, self._sigkill = sigok, sigkill
+        self.ylim_tree = ylim_tree
+        self.dfmans = {}
+        for pair in pairs:
+            self.add(pair)
+
+        self.data_thread = Thread(target=(self.recv_data))
+        self.data_thread.start()
+
+    def add(self, pair: str) -> OnlineDFman:
+        if pair not in self.dfmans:
+            self.dfmans[pair] = OnlineDFman(None, self._sigok, self._sigkill, self.ylim_tree)
+        return self.dfmans[pair]
+
+    def __getitem__(self, pair: str) -> OnlineDFman:
+        return self.dfmans[pair]
+
+    def recv_data(self):
+        while 1:
+            data = self.data.recv()
+            if isinstance(data, list):
+                for pair, bars in data:
+                    if pair in self.dfmans:
+                        self.dfmans[pair].consume(bars)
                 self.data.send(self._sigok)
-                self.local_update()
             else:
                 if data == self._sigkill:
                     return
@@ -0,0 +1,156 @@
+"""
+array kernels behind the loop-bound indicators in `cmnfunc`.
+kernels work on raw contiguous arrays, sequential ones are compiled with numba if it is
+installed and fall back to plain python loops over lists otherwise"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+JIT = njit is not None
+
+
+def _jit(func):
+    """compile `func` with numba when available, keep the python function otherwise"""
+    return njit(cache=True, nogil=True)(func) if JIT else func
+
+
+def _as_input(x):
+    """contiguous float array for a compiled kernel, a list for the python loop"""
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    return x if JIT else x.tolist()
+
+
+@_jit
+def _psar(high, low, psar, iaf, maxaf):
+    bull = True
+    af = iaf
+    hp = high[0]
+    lp = low[0]
+    for i in range(2, len(psar)):
+        x = hp if bull else lp
+        psar[i] = psar[i - 1] + af * (x - psar[i - 1])
+        reverse = False
+        if bull:
+            if low[i] < psar[i]:
+                bull = False
+                reverse = True
+                psar[i] = hp
+                lp = low[i]
+                af = iaf
+        else:
+            if high[i] > psar[i]:
+                bull = True
+                reverse = True
+                psar[i] = lp
+                hp = high[i]
+                af = iaf
+
+        if not reverse:
+            if bull:
+                if high[i] > hp:
+                    hp = high[i]
+                    af = min(af + iaf, maxaf)
+                if low[i - 1] < psar[i]:
+                    psar[i] = low[i - 1]
+                if low[i - 2] < psar[i]:
+                    psar[i] = low[i - 2]
+            else:
+                if low[i] < lp:
+                    lp = low[i]
+                    af = min(af + iaf, maxaf)
+                if high[i - 1] > psar[i]:
+                    psar[i] = high[i - 1]
+                if high[i - 2] > psar[i]:
+                    psar[i] = high[i - 2]
+    return psar
+
+
+def psar(high, low, close, iaf=0.02, maxaf=0.2) -> np.ndarray:
+    """parabolic sar over `high`, `low` & `close` arrays"""
+    if not len(close):
+        return np.empty(0)
+    psar = np.array(close, dtype=np.float64)
+    psar = _psar(
+        _as_input(high), _as_input(low), psar if JIT else psar.tolist(), iaf, maxaf
+    )
+    return np.asarray(psar, dtype=np.float64)
+
+
+@_jit
+def _p_sar(high, low, trend, ep, sar, acc_f, acc_max):
+    trend[0] = 1
+    for x in range(1, len(sar)):
+        if trend[x - 1] == 1:
+            if low[x] > low[x - 1]:
+                trend[x] = 1
+                ep[x] = max(high[x], ep[x - 1])
+            else:
+                trend[x] = -1
+                ep[x] = min(low[x], ep[x - 1])
+        else:
+            if high[x] < high[x - 1]:
+                trend[x] = -1
+                ep[x] = min(low[x], ep[x - 1])
+            else:
+                trend[x] = 1
+                ep[x] = max(high[x], ep[x - 1])
+        if trend[x - 1] == 1:
+            sar[x] = sar[x - 1] + acc_f * (ep[x - 1] - sar[x - 1])
+            sar[x] = min(sar[x], min(low[x - 1], low[x - 2]))
+        else:
+            sar[x] = sar[x - 1] - acc_f * (sar[x - 1] - ep[x - 1])
+            sar[x] = max(sar[x], max(high[x - 1], high[x - 2]))
+
+        if trend[x] == 1 and sar[x] > low[x]:
+            trend[x] = -1
+            sar[x] = ep[x - 1]
+            ep[x] = high[x]
+        elif trend[x] == -1 and sar[x] < high[x]:
+            trend[x] = 1
+            sar[x] = ep[x - 1]
+            ep[x] = low[x]
+        if acc_f < acc_max:
+            acc_f += acc_f
+    return sar
+
+
+def p_sar(high, low, acc_f=0.02, acc_max=0.2) -> np.ndarray:
+    """parabolic sar variant of `cmnfunc.p_sar`, zeros are returned as nan"""
+    size = len(high)
+    if not size:
+        return np.empty(0)
+    state = (np.zeros(size) if JIT else [0.0] * size for _ in range(3))
+    sar = np.asarray(
+        _p_sar(_as_input(high), _as_input(low), *state, acc_f, acc_max),
+        dtype=np.float64,
+    )
+    return np.where(sar == 0, np.nan, sar)
+
+
+def wma(close, period: int = 14) -> np.ndarray:
+    """weighted moving average, every window is dotted with the weights in one matmul"""
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    weights = np.arange(1, period + 1)
+    wma = np.zeros(len(close))
+    if len(close) >= period:
+        wma[period - 1 :] = sliding_window_view(close, period) @ weights / np.sum(
+            weights
+        )
+    return np.where(wma == 0, np.nan, wma)
+
+
+def cross(diff, count=0, direction=1) -> np.ndarray:
+    """
+    positions (counted from the start if direction, else from the end) at which `diff`
+    changes sign, at most `count` of them unless count is 0"""
+    below = np.asarray(diff, dtype=np.float64) < 0
+    if not direction:
+        below = below[::-1]
+    index = np.flatnonzero(below[1:] != below[:-1]) + 1
+    if count:
+        index = index[:count]
+    return index
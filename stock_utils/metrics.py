@@ -0,0 +1,198 @@
+"""
+opt-in metrics of the hot paths: latency / size histograms and counters.
+disabled by default, every recording call then returns after a single flag check.
+
+>>> metrics.enable(export="metrics-{pid}.json", every=10)   # or STOCK_UTILS_METRICS=1
+>>> with metrics.timer("candle.make_candles"):
+    >>> ...
+>>> metrics.snapshot()      # or metrics.serve(9464) to read it over http
+
+names used by the package: candle.make_candles, candle.update, update_artists(.ax0/.ax1/
+.ax2/.indicators), blit.frame/on_draw, feed.request/decode/parse/payload_bytes,
+dfman.append, replay.seconds and the candle.bars, feed.bars, dfman.bars and replay.bars
+counters.
+
+every process keeps its own registry (a feed process inherits the enabled state), `export`
+is formatted with the pid so each writes its own snapshot file at most every `every` s"""
+import json
+import math
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread, get_ident
+
+OFF = ("", "0", "false", "no", "off")
+ENABLED = os.environ.get("STOCK_UTILS_METRICS", "").strip().lower() not in OFF
+EXPORT = {"path": os.environ.get("STOCK_UTILS_METRICS_FILE"), "every": 10.0, "next": 0.0}
+
+
+class Histogram:
+    def __init__(self):
+        """count, sum, min, max and power-of-2 buckets of the observed values"""
+        self.count, self.sum = 0, 0.0
+        self.min, self.max = math.inf, -math.inf
+        self.buckets = {}  # exponent e -> observations in [2**(e-1), 2**e)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        exp = math.frexp(value)[1] if value > 0 else -1074
+        self.buckets[exp] = self.buckets.get(exp, 0) + 1
+
+    def quantile(self, q: float) -> float:
+        """upper bound of the bucket holding the `q` quantile, capped at the max"""
+        rank, seen = q * self.count, 0
+        for exp in sorted(self.buckets):
+            seen += self.buckets[exp]
+            if seen >= rank:
+                return min(math.ldexp(1, exp), self.max)
+        return self.max
+
+    def as_dict(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count,
+            "min": self.min,
+            "max": self.max,
+            **{f"p{int(q * 100)}": self.quantile(q) for q in (0.5, 0.9, 0.99)},
+            "buckets": {math.ldexp(1, x): y for x, y in sorted(self.buckets.items())},
+        }
+
+
+class Registry:
+    def __init__(self):
+        self.histograms, self.counters = {}, {}
+        self.lock = Lock()
+
+    def observe(self, name: str, value: float):
+        with self.lock:
+            if (hist := self.histograms.get(name)) is None:
+                hist = self.histograms[name] = Histogram()
+            hist.observe(value)
+
+    def count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "pid": os.getpid(),
+                "time": time.time(),
+                "histograms": {x: y.as_dict() for x, y in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+REGISTRY = Registry()
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        observe(self.name, time.perf_counter() - self.start)
+
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+def enable(export: str = None, every: float = 10.0):
+    """
+    start recording. if `export`, a snapshot is written there (formatted with `pid`) from
+    the recording calls at most every `every` seconds"""
+    global ENABLED
+    ENABLED = True
+    with REGISTRY.lock:
+        EXPORT.update(path=export or EXPORT["path"], every=every, next=0.0)
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def timer(name: str):
+    """context manager observing the seconds spent in its block as `name`"""
+    return _Timer(name) if ENABLED else _NO_TIMER
+
+
+def observe(name: str, value: float):
+    if ENABLED:
+        REGISTRY.observe(name, value)
+        _maybe_export()
+
+
+def count(name: str, n: int = 1):
+    if ENABLED:
+        REGISTRY.count(name, n)
+        _maybe_export()
+
+
+def snapshot() -> dict:
+    return REGISTRY.snapshot()
+
+
+def dump(path: str) -> str:
+    """write a snapshot as json to `path` (formatted with `pid`), returns the path written"""
+    path = path.format(pid=os.getpid())
+    tmp = f"{path}.{get_ident()}.tmp"  # a writer of its own per thread
+    with open(tmp, "w") as wr:
+        json.dump(snapshot(), wr, indent=1)
+    os.replace(tmp, path)
+    return path
+
+
+def _maybe_export():
+    """dump if an export is due, only the recording thread that claims it writes"""
+    with REGISTRY.lock:
+        if not (path := EXPORT["path"]) or (now := time.monotonic()) < EXPORT["next"]:
+            return
+        EXPORT["next"] = now + EXPORT["every"]
+    dump(path)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps(snapshot()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        pass
+
+
+def serve(port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """serve this process's snapshot as json on http://host:port/ from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
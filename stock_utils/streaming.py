@@ -0,0 +1,252 @@
+"""
+stateful counterparts of the indicators in `cmnfunc`.
+each indicator is seeded with an initial history (computed by the batch function) and
+then takes appended bars one at a time or in small batches at O(1) cost per bar"""
+from collections import deque
+from copy import deepcopy
+from math import fsum, nan
+import numpy as np
+import pandas as pd
+from . import cmnfunc as cfc
+
+
+class _Window:
+    def __init__(self, size: int, tail=()):
+        """the last `size` values of a rolling window, nan until the window is full of values"""
+        self.size = size
+        self.values = deque(np.asarray(tail, dtype=float)[-size:].tolist(), maxlen=size)
+
+    def push(self, x: float):
+        self.values.append(float(x))
+        return self
+
+    def _full(self):
+        return len(self.values) == self.size and not any(x != x for x in self.values)
+
+    def sum(self):
+        return fsum(self.values) if self._full() else nan
+
+    def mean(self):
+        return self.sum() / self.size
+
+    def max(self):
+        return max(self.values) if self._full() else nan
+
+    def min(self):
+        return min(self.values) if self._full() else nan
+
+
+class _Ema:
+    def __init__(self, span: int, last: float = nan):
+        """exponential moving average stepped exactly like `pd.Series.ewm(span, adjust=False)`"""
+        self.alpha = 2.0 / (span + 1.0)
+        self.last = last
+
+    def push(self, x: float):
+        if self.last != self.last:
+            self.last = x
+        elif x == x and self.last != x:
+            old_wt = 1.0 - self.alpha
+            self.last = (old_wt * self.last + self.alpha * x) / (old_wt + self.alpha)
+        return self.last
+
+
+class _Stream:
+    names = ()
+
+    def __init__(self, **params):
+        """
+        base of the streaming indicators.
+        every output is kept in growable arrays (geometric growth) so the full series can be
+        handed out as `pd.Series` views without recomputation.
+        `params` are the indicator's arguments, kept for `renew`"""
+        self.params = params
+        self.size = 0
+        self.__index__ = self.__checkpoint__ = None
+        self.__values__ = np.empty((len(self.names), 0))
+
+    def renew(self, history):
+        """a fresh stream with the same arguments seeded with `history`"""
+        return type(self)(history, **self.params)
+
+    def _state(self) -> dict:
+        """the indicator's own state, everything but the outputs"""
+        return {
+            k: deepcopy(v)
+            for k, v in self.__dict__.items()
+            if k not in ("params", "size", "__index__", "__values__", "__checkpoint__")
+        }
+
+    def checkpoint(self):
+        """remember the current state so `rewind` can come back to it"""
+        self.__checkpoint__ = (self.size, self._state())
+
+    def rewind(self, size: int):
+        """
+        go back to the last checkpoint if it was taken at `size` bars or less, outputs after
+        it are dropped. returns the number of bars kept, None if there is no such checkpoint"""
+        if self.__checkpoint__ is None or self.__checkpoint__[0] > size:
+            return None
+        self.size, state = self.__checkpoint__
+        self.__dict__.update(deepcopy(state))
+        return self.size
+
+    def _store(self, index, values):
+        """append `values` -> (len(names), k) at `index`"""
+        index = np.asarray(index)
+        stop = self.size + len(index)
+        if self.__index__ is None:
+            self.__index__ = np.empty(0, dtype=index.dtype)
+        if stop > len(self.__index__):
+            capacity = max(2 * len(self.__index__), stop, 64)
+            grown = np.empty(capacity, dtype=self.__index__.dtype)
+            grown[: self.size] = self.__index__[: self.size]
+            self.__index__ = grown
+            grown = np.empty((len(self.names), capacity))
+            grown[:, : self.size] = self.__values__[:, : self.size]
+            self.__values__ = grown
+        self.__index__[self.size : stop] = index
+        self.__values__[:, self.size : stop] = values
+        self.size = stop
+
+    def _series(self, start: int, stop: int):
+        index = pd.Index(self.__index__[start:stop], copy=False)
+        out = tuple(
+            pd.Series(x[start:stop], index=index, name=name, copy=False)
+            for x, name in zip(self.__values__, self.names)
+        )
+        return out if len(out) > 1 else out[0]
+
+    def series(self, start=None, stop=None):
+        """the outputs for int locators `start:stop` of everything seen so far"""
+        start, stop, _ = slice(start, stop).indices(self.size)
+        return self._series(start, stop)
+
+    def between(self, first, last):
+        """the outputs for index values `first` to `last` (inclusive)"""
+        index = self.__index__[: self.size]
+        return self._series(
+            int(np.searchsorted(index, first, "left")),
+            int(np.searchsorted(index, last, "right")),
+        )
+
+    def first_index(self):
+        return self.__index__[0] if self.size else None
+
+    def last_index(self):
+        return self.__index__[self.size - 1] if self.size else None
+
+    def _push(self, bar) -> tuple:
+        raise NotImplementedError
+
+    def push(self, index, bar):
+        """take a single appended bar, return its outputs"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out = self._push(bar)
+        self._store((index,), np.asarray(out, dtype=float).reshape(-1, 1))
+        return out if len(out) > 1 else out[0]
+
+    def extend(self, data):
+        """take a batch of appended bars (`pd.Series`/`pd.DataFrame`), return their outputs"""
+        start = self.size
+        rows = data.to_numpy() if isinstance(data, pd.Series) else data.to_dict("records")
+        for index, bar in zip(data.index, rows):
+            self.push(index, bar)
+        return self._series(start, self.size)
+
+
+class StreamSMA(_Stream):
+    names = ("sma",)
+
+    def __init__(self, history: pd.Series, window: int):
+        """streaming `cmnfunc.sma`"""
+        super().__init__(window=window)
+        out = cfc.sma(history, window)
+        self._window = _Window(window, history.to_numpy())
+        self._store(history.index, (out.to_numpy(),))
+
+    def _push(self, x):
+        return (self._window.push(x).mean(),)
+
+
+class StreamMACD(_Stream):
+    names = ("signal", "md")
+
+    def __init__(self, history: pd.Series, x=12, y=26, z=9):
+        """streaming `cmnfunc.macd` -> (signal, md)"""
+        super().__init__(x=x, y=y, z=z)
+        ema_x = history.ewm(span=x, adjust=False).mean()
+        ema_y = history.ewm(span=y, adjust=False).mean()
+        md = ema_x - ema_y
+        signal = md.ewm(span=z, adjust=False).mean()
+        self._emas = tuple(
+            _Ema(span, ser.iloc[-1] if len(ser) else nan)
+            for span, ser in ((x, ema_x), (y, ema_y), (z, signal))
+        )
+        self._store(history.index, (signal.to_numpy(), md.to_numpy()))
+
+    def _push(self, x):
+        md = self._emas[0].push(x) - self._emas[1].push(x)
+        return self._emas[2].push(md), md
+
+
+class StreamStoch(_Stream):
+    names = ("k", "D")
+
+    def __init__(self, history: pd.DataFrame, period=14, h="h", l="l", c="c"):
+        """streaming `cmnfunc.stoch` -> (k, D)"""
+        super().__init__(period=period, h=h, l=l, c=c)
+        self.__columns__ = (h, l, c)
+        k, D = cfc.stoch(history, period, h=h, l=l, c=c)
+        hh = history[h].rolling(9).max()
+        ll = history[l].rolling(36).min()
+        raw = (history[c] - ll) / (hh - ll) * 100
+        self._h, self._l = _Window(9, history[h]), _Window(36, history[l])
+        self._raw, self._k = _Window(period, raw), _Window(12, k)
+        self._store(history.index, (k.to_numpy(), D.to_numpy()))
+
+    def _push(self, bar):
+        h, l, c = (np.float64(bar[x]) for x in self.__columns__)
+        hh, ll = self._h.push(h).max(), self._l.push(l).min()
+        k = self._raw.push((c - ll) / (hh - ll) * 100).mean()
+        return k, self._k.push(k).mean()
+
+
+class StreamRSI(_Stream):
+    names = ("rsi",)
+
+    def __init__(self, history: pd.Series, period: int = 14):
+        """streaming `cmnfunc.add_rsi`"""
+        super().__init__(period=period)
+        out = cfc.add_rsi(history, period)
+        diff = history.diff()
+        self._last = history.iloc[-1] if len(history) else nan
+        self._up = _Window(period, diff.clip(lower=0))
+        self._down = _Window(period, -1 * diff.clip(upper=0))
+        self._store(history.index, (out.to_numpy(),))
+
+    def _push(self, x):
+        diff, self._last = np.float64(x) - self._last, x
+        rsi = self._up.push(max(diff, 0.0)).mean() / np.float64(
+            self._down.push(-min(diff, 0.0)).mean()
+        )
+        return (100 - (100 / (1 + rsi)),)
+
+
+class StreamATR(_Stream):
+    names = ("atr",)
+
+    def __init__(self, history: pd.DataFrame, window: int = 14):
+        """streaming `cmnfunc.avg_tr`"""
+        super().__init__(window=window)
+        out = cfc.avg_tr(history, window=window)
+        tr = cfc.true_range(history["h"], history["l"], history["c"])
+        self._last = history["c"].iloc[-1] if len(history) else nan
+        self._tr = _Window(window, tr)
+        self._store(history.index, (out.to_numpy(),))
+
+    def _push(self, bar):
+        h, l, c = (np.float64(bar[x]) for x in ("h", "l", "c"))
+        tr = np.nanmax((h - l, abs(h - self._last), abs(l - self._last)))
+        self._last = c
+        return (self._tr.push(tr).sum() / self._tr.size,)
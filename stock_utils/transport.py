@@ -0,0 +1,418 @@
+"""
+transports of bars between a feed process and its consumer.
+
+ring
+----
+shared-memory transport.
+a `multiprocessing.shared_memory` ring holds fixed-width float64 bar records
+`(d, o, h, l, c)`; the feed writes new bars into it and the consumer reads them back as
+DataFrames, so nothing is pickled. the consumer publishes how far it read and the feed
+waits for free slots instead of lapping it. both ends look like the ends of a duplex
+`multiprocessing.Pipe` (`send`, `recv`, `poll`, `close`), DataFrames go through the ring and
+int signals (sigok / sigkill) through the header. the feed end unlinks the segment on kill
+(and the creating process at exit), the consumer end closes its handle when it sends sigkill:
+
+>>> feed_end, consumer_end = ring_pipe(4096, sigkill=SIGKILL)
+>>> OnlineDFman(consumer_end, SIGOK, SIGKILL)
+
+queue
+-----
+a bounded, non-blocking protocol (`queue_pipe`). the feed never waits on the consumer:
+past the high watermark its batches are coalesced locally and handed over as one once the
+consumer drains below the low watermark, a consumer that fell behind gets every queued
+batch merged into one, and kill / health go out of band of the bars.
+"""
+import time
+import weakref
+from multiprocessing import Array, Event, Pipe, Queue, Value
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
+import numpy as np
+import pandas as pd
+from .cmnfunc import COLUMNS
+
+NOSIG = -(2**62)  # no signal pending
+# int64 slots: bars written, signal to the consumer, signal to the feed, bars read, closed
+HEADER = 5
+
+
+class RingOverrun(RuntimeError):
+    """the consumer of a `ShmRing` fell a whole ring behind"""
+
+
+def _unlink(shm: SharedMemory):
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class ShmRing:
+    def __init__(self, capacity: int = 4096, columns=COLUMNS, name: str = None, timeout: float = 60.0):
+        """
+        args
+        ----
+        capacity    bar records kept, the feed waits for the consumer past that
+        columns     value columns of a record, after the index
+        name        attach to an existing ring instead of creating one
+        timeout     seconds `write` waits for free slots before raising `RingOverrun`,
+                    None waits for ever
+        """
+        self.capacity, self.columns, self.timeout = capacity, list(columns), timeout
+        width = len(self.columns) + 1
+        size = HEADER * 8 + capacity * width * 8
+        self.owner = name is None
+        self.shm = SharedMemory(name, create=self.owner, size=size if self.owner else 0)
+        self.header = np.ndarray((HEADER,), np.int64, self.shm.buf)
+        self.records = np.ndarray((capacity, width), np.float64, self.shm.buf, HEADER * 8)
+        if self.owner:
+            self.header[:] = (0, NOSIG, NOSIG, 0, 0)
+            weakref.finalize(self, _unlink, self.shm)  # whatever the ends did, at exit
+        self.ready, self.acked, self.freed = Event(), Event(), Event()
+
+    def __getstate__(self):
+        events = self.ready, self.acked, self.freed
+        return self.shm.name, self.capacity, self.columns, self.timeout, events
+
+    def __setstate__(self, state):
+        name, capacity, columns, timeout, events = state
+        self.__init__(capacity, columns, name, timeout)
+        self.ready, self.acked, self.freed = events
+
+    def attach(self) -> "ShmRing":
+        """another handle on this ring, closing one end's handle leaves the other's mapped"""
+        ring = ShmRing.__new__(ShmRing)
+        ring.__setstate__(self.__getstate__())
+        return ring
+
+    @property
+    def written(self) -> int:
+        return int(self.header[0])
+
+    @property
+    def closed(self) -> bool:
+        """this handle was closed"""
+        return not hasattr(self, "header")
+
+    def _wait_free(self, n: int) -> bool:
+        """wait until `n` records are free, False if the consumer closed its end meanwhile"""
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while self.written + n - int(self.header[3]) > self.capacity:
+            self.freed.clear()
+            if self.header[4]:
+                return False
+            if self.written + n - int(self.header[3]) <= self.capacity:
+                break
+            left = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not self.freed.wait(left):
+                raise RingOverrun(
+                    f"the consumer read nothing for {self.timeout}s with the ring of "
+                    f"{self.capacity} bars full"
+                )
+        return not self.header[4]
+
+    def write(self, data: pd.DataFrame):
+        """
+        copy the bars of `data` into the ring, a ring at a time for a bigger batch, waiting
+        for the consumer to free slots. dropped once the consumer closed its end"""
+        rows = np.empty((len(data), len(self.columns) + 1))
+        rows[:, 0] = data.index
+        rows[:, 1:] = data[self.columns].to_numpy(dtype=float)
+        for piece in range(0, len(rows), self.capacity):
+            piece = rows[piece : piece + self.capacity]
+            n = len(piece)
+            if not self._wait_free(n):
+                return
+            seq = self.written
+            first = seq % self.capacity
+            head = min(n, self.capacity - first)
+            self.records[first : first + head] = piece[:head]
+            self.records[: n - head] = piece[head:]
+            self.header[0] = seq + n  # published only once the records are in place
+            self.ready.set()
+
+    def read(self, start: int, name: str = "d") -> tuple[pd.DataFrame, int]:
+        """
+        bars written since sequence number `start` -> (DataFrame, next start).
+        the bars are copied out of the ring, then the slots are handed back to the feed"""
+        stop = self.written
+        if start < stop - self.capacity:
+            raise RingOverrun(f"bars {start} to {stop - self.capacity} were overwritten unread")
+        first, last = start % self.capacity, (stop - 1) % self.capacity + 1
+        if stop - start <= self.capacity - first:
+            rows = self.records[first : first + stop - start].copy()
+        else:
+            rows = np.concatenate((self.records[first:], self.records[:last]))
+        self.header[3] = stop
+        self.freed.set()
+        pdf = pd.DataFrame(
+            rows[:, 1:],
+            index=pd.Index(rows[:, 0], name=name, copy=False),
+            columns=self.columns,
+            copy=False,
+        )
+        return pdf, stop
+
+    def close(self, unlink: bool = None):
+        """unmap this handle (once) and unlink the segment if `unlink` (by default if it created it)"""
+        if not self.closed:
+            del self.header, self.records
+            self.shm.close()
+        if self.owner if unlink is None else unlink:
+            _unlink(self.shm)
+
+
+class _Signal:
+    """one pending int signal in a header slot, with an Event to wake the receiver"""
+
+    def __init__(self, ring: ShmRing, slot: int, event):
+        self.ring, self.slot, self.event = ring, slot, event
+
+    def put(self, sig: int):
+        if not isinstance(sig, (int, np.integer)):
+            raise TypeError(f"only DataFrames and int signals go through the ring, got {sig!r}")
+        self.ring.header[self.slot] = sig
+        self.event.set()
+
+    def take(self):
+        sig = int(self.ring.header[self.slot])
+        if sig != NOSIG:
+            self.ring.header[self.slot] = NOSIG
+            return sig
+        return None
+
+
+class RingFeedEnd:
+    """
+    the feed's end: `send` DataFrames / signals, `recv` the consumer's signals.
+    sending or receiving `sigkill` closes it"""
+
+    def __init__(self, ring: ShmRing, sigkill: int = None):
+        self.ring, self.sigkill = ring, sigkill
+        self.__out__ = _Signal(ring, 1, ring.ready)
+        self.__in__ = _Signal(ring, 2, ring.acked)
+
+    def send(self, data):
+        if isinstance(data, pd.DataFrame):
+            self.ring.write(data)
+        else:
+            self.__out__.put(data)
+            if data == self.sigkill:
+                self.close()
+
+    def poll(self, timeout: float = 0) -> bool:
+        if self.ring.closed:
+            return False
+        return self.ring.header[2] != NOSIG or (
+            bool(timeout) and self.ring.acked.wait(timeout) and self.ring.header[2] != NOSIG
+        )
+
+    def recv(self) -> int:
+        while (sig := self.__in__.take()) is None:
+            self.ring.acked.wait()
+            self.ring.acked.clear()
+        if sig == self.sigkill:
+            self.close()
+        return sig
+
+    def close(self):
+        """unmap and unlink the ring, bars already written stay readable by the consumer"""
+        self.ring.close(unlink=True)
+
+
+class RingConsumerEnd:
+    """
+    the consumer's end: `recv` new bars (or the feed's signals), `send` signals back.
+    sending `sigkill` closes it"""
+
+    def __init__(self, ring: ShmRing, sigkill: int = None):
+        self.ring, self.sigkill = ring, sigkill
+        self.__in__ = _Signal(ring, 1, ring.ready)
+        self.__out__ = _Signal(ring, 2, ring.acked)
+        self.read_seq = 0
+
+    def send(self, sig: int):
+        self.__out__.put(sig)
+        if sig == self.sigkill:
+            self.close()
+
+    def close(self):
+        """tell the feed to stop writing and unmap this end's handle"""
+        if not self.ring.closed:
+            self.ring.header[4] = 1
+            self.ring.freed.set()
+        self.ring.close(unlink=False)
+
+    def poll(self, timeout: float = 0) -> bool:
+        pending = lambda: self.ring.written > self.read_seq or self.ring.header[1] != NOSIG
+        return pending() or (bool(timeout) and self.ring.ready.wait(timeout) and pending())
+
+    def recv(self):
+        """new bars as a DataFrame, or a signal from the feed once every bar was read"""
+        while True:
+            if self.ring.written > self.read_seq:
+                pdf, self.read_seq = self.ring.read(self.read_seq)
+                return pdf
+            if (sig := self.__in__.take()) is not None:
+                return sig
+            self.ring.ready.wait()
+            self.ring.ready.clear()
+
+
+def ring_pipe(
+    capacity: int = 4096, columns=COLUMNS, sigkill: int = None
+) -> tuple[RingFeedEnd, RingConsumerEnd]:
+    """
+    a `Pipe(duplex=True)` look-alike carrying bars through a shared-memory `ShmRing`, each
+    end on its own handle of the ring"""
+    ring = ShmRing(capacity, columns)
+    return RingFeedEnd(ring, sigkill), RingConsumerEnd(ring.attach(), sigkill)
+
+
+def coalesce(frames) -> pd.DataFrame:
+    """merge batches of bars into one, a later bar replaces an earlier one with its timestamp"""
+    pdf = pd.concat(frames) if len(frames) > 1 else frames[0]
+    return pdf[~pdf.index.duplicated(keep="last")].sort_index()
+
+
+class BarQueue:
+    def __init__(self, high: int = 8, low: int = 2):
+        """
+        args
+        ----
+        high    queued batches past which the feed starts coalescing instead of queueing
+        low     queued batches at or under which the coalesced bars are handed over
+        """
+        if not 0 <= low < high:
+            raise ValueError(f"watermarks must satisfy 0 <= low < high, got {low=}, {high=}")
+        self.high, self.low = high, low
+        self.queue = Queue()
+        self.depth = Value("i", 0)
+        self.kill = Event()
+        self.beats = Array("d", (time.time(), time.time()), lock=False)  # feed, consumer
+
+    def health(self) -> dict:
+        """queue depth, seconds since either end was last active and whether it was killed"""
+        now = time.time()
+        return {
+            "depth": self.depth.value,
+            "feed_idle": now - self.beats[0],
+            "consumer_idle": now - self.beats[1],
+            "killed": self.kill.is_set(),
+        }
+
+
+class QueueFeedEnd:
+    """the feed's end of a `queue_pipe`: `send` never blocks, `poll` tells about a kill"""
+
+    def __init__(self, bq: BarQueue, sigkill: int):
+        self.bq, self.sigkill = bq, sigkill
+        self.pending = None  # bars coalesced into one frame while the consumer is behind
+
+    def _put(self, data):
+        with self.bq.depth.get_lock():
+            self.bq.depth.value += 1
+        self.bq.queue.put(data)
+
+    def flush(self):
+        """hand the coalesced bars over once the consumer got down to the low watermark"""
+        if self.pending is not None and self.bq.depth.value <= self.bq.low:
+            self._put(self.pending)
+            self.pending = None
+
+    def send(self, data):
+        self.bq.beats[0] = time.time()
+        if not isinstance(data, pd.DataFrame):
+            if data == self.sigkill:
+                if self.pending is not None:  # the last bars go out before the kill
+                    self._put(self.pending)
+                    self.pending = None
+                self.bq.kill.set()
+                self._put(data)  # wakes a consumer waiting on the queue
+            return
+        if self.pending is not None or self.bq.depth.value >= self.bq.high:
+            # merged on arrival, a stalled consumer leaves one deduplicated frame behind
+            self.pending = coalesce([data] if self.pending is None else [self.pending, data])
+            self.flush()
+        else:
+            self._put(data)
+
+    def poll(self, timeout: float = 0) -> bool:
+        self.bq.beats[0] = time.time()
+        self.flush()
+        return self.bq.kill.is_set() or (bool(timeout) and self.bq.kill.wait(timeout))
+
+    def recv(self) -> int:
+        """the consumer only ever sends a kill"""
+        self.bq.kill.wait()
+        return self.sigkill
+
+
+class QueueConsumerEnd:
+    """the consumer's end of a `queue_pipe`: `recv` the bars queued so far as one batch"""
+
+    def __init__(self, bq: BarQueue, sigkill: int):
+        self.bq, self.sigkill = bq, sigkill
+        self.__killed__ = False
+
+    def _get(self, block: bool):
+        item = self.bq.queue.get(block)
+        with self.bq.depth.get_lock():
+            self.bq.depth.value -= 1
+        return item
+
+    def send(self, sig: int):
+        """a kill is signalled out of band, anything else only reports the consumer alive"""
+        self.bq.beats[1] = time.time()
+        if sig == self.sigkill:
+            self.bq.kill.set()
+
+    def poll(self, timeout: float = 0) -> bool:
+        if self.bq.depth.value or self.bq.kill.is_set():
+            return True
+        return bool(timeout) and (self.bq.kill.wait(timeout) or bool(self.bq.depth.value))
+
+    def recv(self):
+        """every queued batch merged into one DataFrame, or sigkill after the feed's kill"""
+        self.bq.beats[1] = time.time()
+        if self.__killed__:
+            return self.sigkill
+        frames, item = [], self._get(True)
+        while isinstance(item, pd.DataFrame):
+            frames.append(item)
+            try:
+                item = self._get(False)
+            except Empty:
+                break
+        else:
+            self.__killed__ = True
+            if not frames:
+                return self.sigkill
+        return coalesce(frames)
+
+
+def queue_pipe(sigkill: int, high: int = 8, low: int = 2) -> tuple[QueueFeedEnd, QueueConsumerEnd]:
+    """a `Pipe(duplex=True)` look-alike over a bounded, non-blocking `BarQueue`"""
+    bq = BarQueue(high, low)
+    return QueueFeedEnd(bq, sigkill), QueueConsumerEnd(bq, sigkill)
+
+
+def consumer_quit(feed_end, sigkill: int) -> bool:
+    """
+    drain what the consumer sent back to `feed_end` without blocking (sigok heartbeats are
+    dropped), True if it asked to quit with `sigkill`"""
+    while feed_end.poll():
+        if feed_end.recv() == sigkill:
+            return True
+    return False
+
+
+def make_pipe(shm_capacity: int = None, watermarks: tuple = None, sigkill: int = None):
+    """
+    `Pipe(duplex=True)`, a `ring_pipe` of `shm_capacity` bars if given, or a `queue_pipe`
+    with `(high, low)` watermarks if given"""
+    if shm_capacity:
+        return ring_pipe(shm_capacity, sigkill=sigkill)
+    if watermarks:
+        return queue_pipe(sigkill, *watermarks)
+    return Pipe(duplex=True)
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def bars(n: int, seed: int = 0, vol: float = 1e-3) -> pd.DataFrame:
+    """
+    `n` one minute OHLC bars indexed by matplotlib dates (like `get_pdf(date_2_num=True)`):
+    closes are a random walk of log returns with std `vol`, each open is the last close"""
+    rng = np.random.default_rng(seed)
+    c = 100 * np.exp(np.cumsum(rng.normal(0, vol, n)))
+    o = np.r_[c[:1], c[:-1]]
+    h = np.maximum(o, c) * (1 + rng.uniform(0, 1e-3, n))
+    l = np.minimum(o, c) * (1 - rng.uniform(0, 1e-3, n))
+    index = pd.Index(19000 + np.arange(n) / 1440, name="d")
+    return pd.DataFrame({"o": o, "h": h, "l": l, "c": c}, index=index)
+
+
+@pytest.fixture
+def make_bars():
+    """`bars`, the synthetic OHLC generator shared by the tests"""
+    return bars
+
+
+def epoch_bars(n: int, end: int, step: int = 60, seed: int = 0) -> pd.DataFrame:
+    """`bars` indexed by epoch seconds on the `step` grid up to `end`, as a `StandIn` serves"""
+    pdf = bars(n, seed)
+    pdf.index = pd.Index(end - end % step - step * np.arange(n)[::-1], name="d")
+    return pdf
+
+
+@pytest.fixture
+def make_epoch_bars():
+    return epoch_bars
@@ -0,0 +1,85 @@
+import asyncio
+import time
+import pandas as pd
+import pytest
+from stock_utils import cmnfunc as cfc
+from stock_utils.data_pull.bitstamp.asyncfeed import AsyncBFeed, HTTPPool, MultiFeed, run_feeds
+from stock_utils.data_pull.bitstamp.datafeed import BFeed, Uri, read_pairs
+from stock_utils.data_pull.bitstamp.standin import StandIn
+
+SIGOK, SIGKILL = 0, 1
+PAIR = dict(read_pairs()[0], start_data_length=200, sec_data_interval=60)
+
+
+@pytest.fixture
+def served(make_epoch_bars):
+    return make_epoch_bars(600, int(time.time()))
+
+
+def expected(served, query: dict):
+    """the bars `query` asks for, as the feeds parse them"""
+    pdf = served[served.index >= int(query["start"])].iloc[: int(query["limit"])].copy()
+    pdf.index = pd.Index(cfc.epoch2num(pdf.index.to_series()), name="d")
+    return pdf
+
+
+def get_all(server: StandIn, count: int, size: int = 4, concurrent: bool = False) -> list:
+    """`count` GETs of the ohlc uri over one `HTTPPool` -> [(status, body), ...]"""
+    url = f"{server.uri}eurusd/?limit=50&step=60"
+
+    async def run():
+        pool = HTTPPool(size=size, timeout=5)
+        try:
+            if concurrent:
+                return await asyncio.gather(*(pool.get(url) for _ in range(count)))
+            return [await pool.get(url) for _ in range(count)]
+        finally:
+            await pool.close()
+
+    return asyncio.run(run())
+
+
+def test_chunked_body_equals_content_length_body(served):
+    with StandIn(served) as plain, StandIn(served, chunked=7) as chunked:
+        (status, body), = get_all(plain, 1)
+        assert get_all(chunked, 3) == [(status, body)] * 3
+    assert status == 200 and len(body) > 7
+    assert chunked.connections == 1
+
+
+def test_connection_reuse(served):
+    with StandIn(served) as server:
+        assert len(set(get_all(server, 5))) == 1
+        assert (len(server.requests), server.connections) == (5, 1)
+        get_all(server, 12, size=3, concurrent=True)
+        assert 1 < server.connections <= 1 + 3
+
+
+@pytest.mark.parametrize("chunked", [0, 5])
+def test_reconnect_after_server_closes(served, chunked):
+    """an idle connection the server hung up on is retried once on a fresh one"""
+    with StandIn(served, chunked=chunked, keep_alive=2) as server:
+        responses = get_all(server, 6)
+    assert len(set(responses)) == 1 and responses[0][0] == 200
+    assert (len(server.requests), server.connections) == (6, 3)
+
+
+def test_async_feed_bars_match_bfeed(served):
+    with StandIn(served, chunked=64) as server:
+        feed = AsyncBFeed(SIGOK, SIGKILL, base=server.uri, pair=PAIR)
+        asyncio.run(run_feeds(feed, run_forever=False))
+        bfeed = BFeed(SIGOK, SIGKILL)
+        bfeed.uri_maker = Uri(server.uri, PAIR)
+        bfeed.start_pull()
+        got, want = feed.recver.recv(), bfeed.recver.recv()
+    (_, query), (_, bquery) = server.requests
+    assert len(got) == len(want) == PAIR["start_data_length"]
+    pd.testing.assert_frame_equal(got, expected(served, query), check_exact=True)
+    pd.testing.assert_frame_equal(want, expected(served, bquery), check_exact=True)
+
+
+def test_multifeed_rejects_a_pair_configured_twice():
+    pairs = read_pairs()
+    assert MultiFeed(SIGOK, SIGKILL, pairs).pairs == [x["exchange"] for x in pairs]
+    with pytest.raises(ValueError, match=pairs[0]["exchange"]):
+        MultiFeed(SIGOK, SIGKILL, pairs + [dict(pairs[0], sec_data_interval=3600)])
@@ -0,0 +1,75 @@
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from stock_utils.data_pull.bitstamp import exceptions
+from stock_utils.data_pull.bitstamp.backfill import RateLimit, backfill, windows
+from stock_utils.data_pull.bitstamp.standin import StandIn
+
+STEP, END = 60, 1_700_000_000 - 1_700_000_000 % 60
+
+
+@pytest.fixture
+def served(make_epoch_bars):
+    return make_epoch_bars(2000, END)
+
+
+def expected(served, start, end):
+    pdf = served[(served.index >= start) & (served.index <= end)]
+    return pdf.set_axis(pdf.index.astype(np.float64), axis=0)
+
+
+def test_windows_of_an_unaligned_start():
+    start = END - 250 * STEP + 17
+    got = windows(start, END, STEP, limit=100)
+    assert got[0][0] == start - 17 and got[-1][1] == END
+    assert [x for x, _ in got[1:]] == [y + STEP for _, y in got[:-1]]
+    assert all((y - x) // STEP + 1 <= 100 for x, y in got)
+    with pytest.raises(exceptions.LimitError):
+        windows(start, END, STEP, limit=exceptions.LIMIT["limit"] + 1)
+
+
+@pytest.mark.parametrize("offset", [0, 17])
+def test_backfill_matches_served_bars(served, offset):
+    start = END - 1234 * STEP + offset
+    with StandIn(served) as server:
+        pdf = backfill("btcusd", start, END, STEP, base=server.uri, rate=1000, limit=100)
+    assert len(server.requests) == len(windows(start, END, STEP, 100)) == 13
+    pd.testing.assert_frame_equal(pdf, expected(served, start, END), check_exact=True)
+
+
+def test_overlapping_pages_are_deduplicated(served):
+    """a server ignoring `end` returns whole pages, each overlapping the next windows"""
+    start, end = END - 700 * STEP + 5, END - 100 * STEP
+    with StandIn(served) as server:
+        ohlc = server.ohlc
+        server.ohlc = lambda pair, query: ohlc(pair, {"start": query["start"], "step": query["step"]})
+        pdf = backfill("btcusd", start, end, STEP, base=server.uri, rate=1000, limit=64)
+    assert pdf.index.is_unique and pdf.index.is_monotonic_increasing
+    pd.testing.assert_frame_equal(pdf, expected(served, start, end), check_exact=True)
+
+
+def test_rate_limit_spaces_calls():
+    async def run(limiter, n):
+        stamps = []
+
+        async def call():
+            await limiter.wait()
+            stamps.append(time.monotonic())
+
+        await asyncio.gather(*(call() for _ in range(n)))
+        return np.diff(sorted(stamps))
+
+    gaps = asyncio.run(run(RateLimit(50), 8))
+    assert len(gaps) == 7 and gaps.min() >= 0.02 - 2e-3
+
+
+def test_backfill_paces_requests(served):
+    arrivals = []
+    with StandIn(served) as server:
+        ohlc = server.ohlc
+        server.ohlc = lambda *args: arrivals.append(time.monotonic()) or ohlc(*args)
+        backfill("btcusd", END - 600 * STEP, END, STEP, base=server.uri, rate=25, limit=100)
+    assert len(arrivals) == 7
+    assert arrivals[-1] - arrivals[0] >= 6 / 25 - 0.01
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+from stock_utils import batch
+from stock_utils import cmnfunc as cfc
+
+
+@pytest.fixture
+def frames(make_bars) -> list:
+    return [make_bars(400, seed=x, vol=2e-3) for x in range(5)]
+
+
+def per_symbol(frames, func, **kwargs) -> np.ndarray:
+    return np.stack([np.asarray(func(x, **kwargs)) for x in frames])
+
+
+@pytest.mark.parametrize("window", [1, 14])
+def test_avg_tr_matches_per_symbol(frames, window):
+    got = batch.avg_tr(batch.make_panel(frames), window=window)
+    np.testing.assert_allclose(got, per_symbol(frames, cfc.avg_tr, window=window), equal_nan=True)
+
+
+def test_true_range_skips_the_missing_previous_close(make_bars):
+    pdf = make_bars(50)
+    tr = cfc.true_range(pdf["h"], pdf["l"], pdf["c"])
+    terms = [pdf["h"] - pdf["l"], (pdf["h"] - pdf["c"].shift(1)).abs(), (pdf["l"] - pdf["c"].shift(1)).abs()]
+    np.testing.assert_array_equal(tr, pd.concat(terms, axis=1).max(axis=1))
+    assert tr.iloc[0] == pdf["h"].iloc[0] - pdf["l"].iloc[0]
+
+
+def test_stoch_matches_per_symbol(frames):
+    k, D = batch.stoch(batch.make_panel(frames))
+    np.testing.assert_allclose(k, per_symbol(frames, lambda x: cfc.stoch(x)[0]), equal_nan=True)
+    np.testing.assert_allclose(D, per_symbol(frames, lambda x: cfc.stoch(x)[1]), equal_nan=True)
@@ -0,0 +1,50 @@
+import os
+import numpy as np
+import pandas as pd
+from stock_utils import cmnfunc as cfc
+
+
+def write_csv(path, n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    c = 100 + np.cumsum(rng.normal(0, 0.1, n))
+    d = 1_680_000_000 + 60 * np.arange(n)
+    pd.DataFrame({"d": d, "o": c, "h": c + 0.1, "l": c - 0.1, "c": c}).to_csv(path, index=False)
+
+
+def test_cache_rewrite_leaves_mapped_frames_intact(tmp_path):
+    """reloading a changed csv replaces the sidecar, frames mapping the old one keep their bars"""
+    csv = str(tmp_path / "bars.csv")
+    write_csv(csv, 2000)
+    kwargs = dict(date_2_num=True, drop_timestamp=True, cache=True)
+    cfc.get_pdf(csv, **kwargs)
+    old = cfc.get_pdf(csv, **kwargs)  # memory-mapped
+    expected = old.to_numpy().copy()
+
+    for n, seed in ((500, 1), (2000, 2)):  # a smaller file, then one of the same size
+        write_csv(csv, n, seed)
+        os.utime(csv, ns=(0, os.stat(csv).st_mtime_ns + 1_000_000_000))
+        new = cfc.get_pdf(csv, **kwargs)
+        assert len(new) == n
+        np.testing.assert_array_equal(old.to_numpy(), expected)
+        fresh = cfc.get_pdf(csv, date_2_num=True, drop_timestamp=True)
+        np.testing.assert_array_equal(cfc.get_pdf(csv, **kwargs).to_numpy(), fresh.to_numpy())
+
+
+def test_partial_sidecar_is_a_miss(tmp_path):
+    csv = str(tmp_path / "bars.csv")
+    write_csv(csv, 300)
+    kwargs = dict(date_2_num=True, drop_timestamp=True, cache=True)
+    cfc.get_pdf(csv, **kwargs)
+    options = dict(
+        drop_timestamp=True,
+        reset_index=False,
+        column1toindex=False,
+        convert_2_readable=False,
+        date_2_num=True,
+    )
+    path = cfc._cache_dir(csv, options)
+    with open(os.path.join(path, "values.npy"), "r+b") as wr:
+        wr.truncate(100)
+    assert cfc._load_cache(path, os.stat(csv)) is None
+    assert len(cfc.get_pdf(csv, **kwargs)) == 300
+    assert not [x for x in os.listdir(path) if x.endswith(".tmp")]
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from stock_utils import cmnfunc as cfc
+from stock_utils.artist.artists.common_artists import CArtists
+from stock_utils.df_man import OnlineDFman
+
+
+def assert_window(carts: CArtists, pdf: pd.DataFrame, first: int, last: int):
+    (signal, md), (k, D) = carts.window(pdf.index[first], pdf.index[last])
+    expected = cfc.macd(pdf["c"]) + cfc.stoch(pdf)
+    for got, full in zip((signal, md, k, D), expected):
+        np.testing.assert_allclose(got, full.iloc[first : last + 1], rtol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("overlap", [1, 5, 40])
+def test_cover_follows_revised_bars(make_bars, overlap):
+    """a batch revising `overlap` stored bars leaves the cached window equal to a recompute"""
+    pdf = make_bars(600)
+    dfm = OnlineDFman(None, 0, 1)
+    dfm.consume(pdf.iloc[:400])
+    carts = CArtists(pdf.iloc[:300])
+    carts.cover(*dfm.take_revised())
+
+    revised = pdf.iloc[400 - overlap : 420].copy()
+    revised.iloc[:overlap] *= 1.01
+    dfm.consume(revised)
+    dfm.consume(pdf.iloc[420:450])
+    carts.cover(*dfm.take_revised())
+
+    assert_window(carts, dfm.pdf, 300, len(dfm.pdf) - 1)
+
+
+def test_cover_same_frame_is_free(make_bars):
+    pdf = make_bars(300)
+    carts = CArtists(pdf.iloc[:100])
+    carts.cover(pdf)
+    streams = carts.streams
+    carts.cover(pdf)
+    assert carts.streams is streams
+    assert_window(carts, pdf, 0, 299)
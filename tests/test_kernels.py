@@ -0,0 +1,187 @@
+"""
+`cmnfunc.psar`, `p_sar`, `wma` and `cross` on the `kernels` (compiled with numba and plain
+python) against the loops they replaced, kept below as the baseline"""
+import importlib.util
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+from stock_utils import cmnfunc as cfc
+
+
+def base_psar(df, iaf=0.02, maxaf=0.2, h="h", l="l", c="c"):
+    length = len(df)
+    high = list(df[h])
+    low = list(df[l])
+    close = list(df[c])
+    psar = close[0 : len(close)]
+    bull = True
+    af = iaf
+    hp = high[0]
+    lp = low[0]
+    for i in range(2, length):
+        x = hp if bull else lp
+        psar[i] = psar[i - 1] + af * (x - psar[i - 1])
+        reverse = False
+        if bull:
+            if low[i] < psar[i]:
+                bull = False
+                reverse = True
+                psar[i] = hp
+                lp = low[i]
+                af = iaf
+        else:
+            if high[i] > psar[i]:
+                bull = True
+                reverse = True
+                psar[i] = lp
+                hp = high[i]
+                af = iaf
+
+        if not reverse:
+            if bull:
+                if high[i] > hp:
+                    hp = high[i]
+                    af = min(af + iaf, maxaf)
+                if low[i - 1] < psar[i]:
+                    psar[i] = low[i - 1]
+                if low[i - 2] < psar[i]:
+                    psar[i] = low[i - 2]
+            else:
+                if low[i] < lp:
+                    lp = low[i]
+                    af = min(af + iaf, maxaf)
+                if high[i - 1] > psar[i]:
+                    psar[i] = high[i - 1]
+                if high[i - 2] > psar[i]:
+                    psar[i] = high[i - 2]
+    return pd.Series(psar, index=df.index, name="psar")
+
+
+def base_p_sar(df, acc_f=0.02, acc_max=0.2):
+    high = df["h"].values
+    low = df["l"].values
+    index = df.index
+    trend = np.zeros(len(df))
+    trend[0] = 1
+    ep = np.zeros(len(df))
+    sar = np.zeros(len(df))
+    for x in range(1, len(df)):
+        if trend[x - 1] == 1:
+            if low[x] > low[x - 1]:
+                trend[x] = 1
+                ep[x] = max(high[x], ep[x - 1])
+            else:
+                trend[x] = -1
+                ep[x] = min(low[x], ep[x - 1])
+        else:
+            if high[x] < high[x - 1]:
+                trend[x] = -1
+                ep[x] = min(low[x], ep[x - 1])
+            else:
+                trend[x] = 1
+                ep[x] = max(high[x], ep[x - 1])
+        if trend[x - 1] == 1:
+            sar[x] = sar[x - 1] + acc_f * (ep[x - 1] - sar[x - 1])
+            sar[x] = min(sar[x], low[x - 1], low[x - 2])
+        else:
+            sar[x] = sar[x - 1] - acc_f * (sar[x - 1] - ep[x - 1])
+            sar[x] = max(sar[x], high[x - 1], high[x - 2])
+
+        if trend[x] == 1 and sar[x] > low[x]:
+            trend[x] = -1
+            sar[x] = ep[x - 1]
+            ep[x] = high[x]
+        elif trend[x] == -1 and sar[x] < high[x]:
+            trend[x] = 1
+            sar[x] = ep[x - 1]
+            ep[x] = low[x]
+        if acc_f < acc_max:
+            acc_f += acc_f
+    sar = np.where(sar == 0, np.nan, sar)
+    return pd.Series(sar, index=index)
+
+
+def base_wma(ser: pd.Series, period: int = 14, name="1"):
+    index = ser.index
+    close = ser.values
+    weights = np.arange(1, period + 1)
+    weights_sum = np.sum(weights)
+    wma = np.zeros(len(ser))
+    for i in range(period - 1, len(ser)):
+        wma[i] = np.dot(weights, close[i - period + 1 : i + 1]) / weights_sum
+    wma = np.where(wma == 0, np.nan, wma)
+    return pd.Series(wma, index=index, name=name)
+
+
+def base_cross(ser1, ser2, count=0, direction=1):
+    index, ser_index = [], ser1.index
+    ser1 = ser1 - ser2
+    ser1.reset_index(inplace=True, drop=True)
+    if not direction:
+        ser1 = ser1[::-1]
+    ser1 = [ser1 < 0][0]
+    zero, counter = ser1.iloc[0], 0
+    for i in ser1.iloc[1:]:
+        counter += 1
+        if i == zero:
+            continue
+        else:
+            zero = i
+            index.append(counter)
+            if len(index) == count:
+                break
+    if not direction:
+        index = (np.array(index) * -1).tolist()
+        if 0 in index:
+            index.remove(0)
+            index.append(len(ser_index))
+        if len(ser_index) in index:
+            index.remove(len(ser_index))
+            index.append(0)
+    index = [ser_index[i] for i in index]
+    return index
+
+
+@pytest.fixture(params=["numba", "python"])
+def kernels(request, monkeypatch):
+    """`cmnfunc` running on the numba kernels, or on a copy of `kernels` imported without numba"""
+    if request.param == "numba":
+        pytest.importorskip("numba")
+        assert cfc.kernels.JIT
+        return cfc.kernels
+    monkeypatch.setitem(sys.modules, "numba", None)
+    spec = importlib.util.find_spec("stock_utils.kernels")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert not module.JIT
+    monkeypatch.setattr(cfc, "kernels", module)
+    return module
+
+
+@pytest.fixture(params=[3, 500, 5000])
+def pdf(request, make_bars) -> pd.DataFrame:
+    return make_bars(request.param, seed=request.param, vol=2e-3)
+
+
+def test_psar(kernels, pdf):
+    pd.testing.assert_series_equal(cfc.psar(pdf), base_psar(pdf), check_exact=True)
+    args = dict(iaf=0.05, maxaf=0.3)
+    pd.testing.assert_series_equal(cfc.psar(pdf, **args), base_psar(pdf, **args), check_exact=True)
+
+
+def test_p_sar(kernels, pdf):
+    pd.testing.assert_series_equal(cfc.p_sar(pdf), base_p_sar(pdf), check_exact=True)
+
+
+@pytest.mark.parametrize("period", [1, 14, 30])
+def test_wma(kernels, pdf, period):
+    pd.testing.assert_series_equal(
+        cfc.wma(pdf["c"], period), base_wma(pdf["c"], period), rtol=1e-12, atol=0
+    )
+
+
+@pytest.mark.parametrize("count, direction", [(0, 1), (3, 1), (0, 0), (3, 0)])
+def test_cross(kernels, pdf, count, direction):
+    fast, slow = cfc.sma(pdf["c"], 3).bfill(), cfc.sma(pdf["c"], 9).bfill()
+    assert cfc.cross(fast, slow, count, direction) == base_cross(fast, slow, count, direction)
@@ -0,0 +1,62 @@
+import time
+from multiprocessing import Process
+import numpy as np
+import pandas as pd
+from stock_utils.transport import queue_pipe, ring_pipe
+
+SIGKILL = 1
+
+
+def drain(consumer_end) -> list:
+    frames = []
+    while isinstance(data := consumer_end.recv(), pd.DataFrame):
+        frames.append(data)
+    return frames
+
+
+def test_queue_backlog_is_one_deduplicated_frame(make_bars):
+    """batches sent past the high watermark merge into a single frame as they arrive"""
+    pdf = make_bars(1000)
+    feed_end, consumer_end = queue_pipe(SIGKILL, high=2, low=0)
+    for start in range(0, 990, 10):
+        feed_end.send(pdf.iloc[max(start - 5, 0) : start + 10])  # overlapping batches
+    assert isinstance(feed_end.pending, pd.DataFrame)
+    assert feed_end.pending.index.is_unique and feed_end.pending.index.is_monotonic_increasing
+    assert consumer_end.bq.depth.value == 2
+
+    feed_end.send(SIGKILL)
+    frames = drain(consumer_end)
+    got = pd.concat(frames)
+    got = got[~got.index.duplicated(keep="last")].sort_index()
+    pd.testing.assert_frame_equal(got, pdf.iloc[:990])
+
+
+def write_batches(feed_end, pdf: pd.DataFrame, sizes: list):
+    """the feed: `pdf` sent in batches of `sizes` bars, then sigkill"""
+    bounds = np.cumsum([0] + sizes)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        feed_end.send(pdf.iloc[start:stop])
+    feed_end.send(SIGKILL)
+
+
+def test_ring_past_capacity_with_a_slow_consumer(make_bars):
+    """the feed waits on a full ring: every bar arrives once, in order and unchanged"""
+    sizes = np.random.default_rng(0).integers(1, 150, 200).tolist()  # some batches > capacity
+    pdf = make_bars(sum(sizes))
+    feed_end, consumer_end = ring_pipe(64, sigkill=SIGKILL)
+    feed = Process(target=write_batches, args=(feed_end, pdf, sizes))
+    feed.start()
+    try:
+        time.sleep(0.3)  # nothing read yet
+        assert consumer_end.ring.written == 64 and feed.is_alive()
+        frames = []
+        while isinstance(data := consumer_end.recv(), pd.DataFrame):
+            frames.append(data)
+            time.sleep(1e-3 * (len(frames) % 3))
+        assert data == SIGKILL
+    finally:
+        feed.join(10)
+        consumer_end.close()
+    assert feed.exitcode == 0
+    assert max(len(x) for x in frames) <= 64 and len(frames) > len(pdf) // 64
+    pd.testing.assert_frame_equal(pd.concat(frames), pdf, check_exact=True)